@@ -0,0 +1,57 @@
+"""
+Compare the bulk construction paths of OrderedSet to `dict.fromkeys`, which
+is the fastest way to deduplicate a list in order in pure Python.
+
+Run it as a script:
+
+    python benchmarks/bench_construction.py --size 1000000
+"""
+import argparse
+import random
+import timeit
+
+from ordered_set import OrderedSet
+
+
+def add_each(items):
+    oset = OrderedSet()
+    for item in items:
+        oset.add(item)
+    return oset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # About half of the items are duplicates.
+    data = [str(rng.randrange(args.size)) for _ in range(args.size)]
+    unique = OrderedSet(data)
+    unique_set = set(unique)
+    half = len(unique) // 2
+    first_half = OrderedSet(unique[:half])
+    second_half = OrderedSet(unique[half:])
+
+    cases = [
+        ("dict.fromkeys(list)", lambda: dict.fromkeys(data)),
+        ("OrderedSet(list)", lambda: OrderedSet(data)),
+        ("add() each item of list", lambda: add_each(data)),
+        ("OrderedSet(OrderedSet)", lambda: OrderedSet(unique)),
+        ("OrderedSet(set)", lambda: OrderedSet(unique_set)),
+        ("OrderedSet.update(list)", lambda: OrderedSet(first_half).update(data)),
+        ("OrderedSet.union(OrderedSet)", lambda: first_half.union(second_half)),
+    ]
+    print(f"{len(data)} items, {len(unique)} unique; best of {args.repeat}")
+    baseline = None
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        if baseline is None:
+            baseline = best
+        print(f"{name:32s} {best * 1000:9.1f} ms  {best / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure the memory used by many small OrderedSets and CompactOrderedSets,
+and by one large OrderedSet and DictOrderedSet, and how fast they are to
+build and look things up in.
+
+Run it as a script:
+
+    python benchmarks/bench_memory.py --count 100000 --large 1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from ordered_set import CompactOrderedSet, DictOrderedSet, OrderedSet
+
+
+def build(cls, contents):
+    tracemalloc.start()
+    start = time.perf_counter()
+    sets = [cls(items) for items in contents]
+    elapsed = time.perf_counter() - start
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sets, size, elapsed
+
+
+def lookup(sets, contents):
+    start = time.perf_counter()
+    for oset, items in zip(sets, contents):
+        for item in items:
+            oset.index(item)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--min-size", type=int, default=2)
+    parser.add_argument("--max-size", type=int, default=10)
+    parser.add_argument("--large", type=int, default=1000000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Share the item objects, so we only measure the sets themselves.
+    words = [f"word{i}" for i in range(1000)]
+    contents = [
+        rng.sample(words, rng.randint(args.min_size, args.max_size))
+        for _ in range(args.count)
+    ]
+
+    print(f"{args.count} sets of {args.min_size} to {args.max_size} items")
+    for cls in (OrderedSet, CompactOrderedSet):
+        sets, size, elapsed = build(cls, contents)
+        lookup_time = lookup(sets, contents)
+        print(
+            f"{cls.__name__:18s} {size / args.count:7.1f} bytes/set  "
+            f"build {elapsed * 1000:7.1f} ms  index() {lookup_time * 1000:7.1f} ms"
+        )
+        del sets
+
+    print(f"\n1 set of {args.large} items")
+    words = [f"word{i}" for i in range(args.large)]
+    for cls in (OrderedSet, DictOrderedSet):
+        sets, size, elapsed = build(cls, [words])
+        start = time.perf_counter()
+        for word in words:
+            word in sets[0]
+        contains_time = time.perf_counter() - start
+        print(
+            f"{cls.__name__:18s} {size / args.large:7.1f} bytes/item "
+            f"build {elapsed * 1000:7.1f} ms  `in`     {contains_time * 1000:7.1f} ms"
+        )
+        del sets
+
+
+if __name__ == "__main__":
+    main()
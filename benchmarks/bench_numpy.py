@@ -0,0 +1,44 @@
+"""
+Time fancy indexing and `get_indexer` with NumPy arrays, compared to the
+per-item loops that OrderedSet used to run for them.
+
+Run it as a script (NumPy is required):
+
+    python benchmarks/bench_numpy.py --size 1000000
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from ordered_set import OrderedSet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    oset = OrderedSet(str(i) for i in range(args.size))
+    indices = rng.integers(0, args.size, args.size)
+    # Half of these keys are missing.
+    keys = np.array([str(i) for i in rng.integers(0, args.size * 2, args.size)])
+    present_keys = np.array([str(i) for i in indices])
+
+    cases = [
+        ("loop: [oset[i] for i in array]", lambda: [oset[i] for i in indices]),
+        ("oset[array]", lambda: oset[indices]),
+        ("loop: [oset.index(k) ...]", lambda: [oset.index(k) for k in present_keys]),
+        ("oset.index(array)", lambda: oset.index(present_keys)),
+        ("oset.get_indexer(array)", lambda: oset.get_indexer(keys)),
+    ]
+    print(f"{args.size} items and keys; best of {args.repeat}")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{name:34s} {best * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
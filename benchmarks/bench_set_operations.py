@@ -0,0 +1,53 @@
+"""
+Compare set operations between OrderedSets to the way they used to be done,
+by copying every other operand into a new `set` first.
+
+Run it as a script:
+
+    python benchmarks/bench_set_operations.py --size 1000000
+"""
+import argparse
+import timeit
+
+from ordered_set import OrderedSet
+
+
+def copying_intersection(oset, *sets):
+    common = set.intersection(*map(set, sets))
+    return OrderedSet(item for item in oset if item in common)
+
+
+def copying_difference(oset, *sets):
+    other = set.union(*map(set, sets))
+    return OrderedSet(item for item in oset if item not in other)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    size = args.size
+    evens = OrderedSet(str(n) for n in range(0, 2 * size, 2))
+    threes = OrderedSet(str(n) for n in range(0, 3 * size, 3))
+    small = OrderedSet(str(n) for n in range(0, 3 * size, 3 * 1000))
+
+    cases = [
+        ("intersection, copying", lambda: copying_intersection(evens, threes)),
+        ("intersection", lambda: evens.intersection(threes)),
+        ("small intersection, copying", lambda: copying_intersection(evens, small)),
+        ("small intersection", lambda: evens.intersection(small)),
+        ("difference, copying", lambda: copying_difference(evens, threes)),
+        ("difference", lambda: evens.difference(threes)),
+        ("intersection_update", lambda: evens.copy().intersection_update(threes)),
+        ("difference_update", lambda: evens.copy().difference_update(threes)),
+    ]
+    print(f"{size} x {size} items (small: {len(small)}); best of {args.repeat}")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{name:32s} {best * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
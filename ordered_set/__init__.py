@@ -5,8 +5,20 @@ entry has an index that can be looked up. It can also act like a Sequence.
 Based on a recipe originally posted to ActiveState Recipes by Raymond Hettiger,
 and released under the MIT license.
 """
+import copyreg
 import itertools as it
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, insort
+from functools import partial, wraps
+from operator import index as as_index, is_not
 from typing import (
+    TYPE_CHECKING,
     Any,
     Dict,
     Iterable,
@@ -14,6 +26,7 @@ from typing import (
     List,
     MutableSet,
     AbstractSet,
+    Optional,
     Sequence,
     Set,
     TypeVar,
@@ -32,6 +45,43 @@ T = TypeVar("T", covariant=True)
 SetLike = Union[AbstractSet[T], Sequence[T]]
 OrderedSetInitializer = Union[AbstractSet[T], Sequence[T], Iterable[T]]
 
+# The binary format written by `.to_bytes()` starts with this header: a magic
+# string, the format version, a code for the type of the items, and the number
+# of items, in little-endian order.
+_BYTES_HEADER = struct.Struct("<4sBcQ")
+_BYTES_MAGIC = b"OSET"
+_BYTES_VERSION = 1
+# The typecode of a 4-byte unsigned integer array, for the lengths of strings.
+_UINT32 = "I" if array("I").itemsize == 4 else "L"
+
+# The header of a file written by `MappedOrderedSet.write()`: a magic string,
+# the format version, whether the numbers that follow are big-endian, the
+# number of items, and the number of slots in the hash table.
+_MAPPED_HEADER = struct.Struct("<4sBBxxQQ")
+_MAPPED_MAGIC = b"OSMM"
+_MAPPED_VERSION = 1
+# An empty slot in the hash table.
+_MAPPED_EMPTY = 0xFFFFFFFF
+
+# Removing an item leaves this placeholder in its slot of the underlying list,
+# so that the indices of the items after it don't have to be rewritten until
+# the list is compacted.
+_DELETED = object()
+_is_live = partial(is_not, _DELETED)
+
+
+class _Shared(tuple):
+    """
+    The type of `_SHARED`, which is used as the `_holes` of an OrderedSet
+    whose storage may be shared with a copy of it. Code that only reads
+    `_holes` sees an empty tuple, meaning there are no placeholders.
+    """
+
+    __slots__ = ()
+
+
+_SHARED = _Shared()
+
 
 def _is_atomic(obj: object) -> bool:
     """
@@ -52,24 +102,66 @@ def _is_atomic(obj: object) -> bool:
     return isinstance(obj, (str, tuple))
 
 
-class OrderedSet(MutableSet[T], Sequence[T]):
+def _is_ndarray(obj: object) -> bool:
     """
-    An OrderedSet is a custom MutableSet that remembers its order, so that
-    every entry has an index that can be looked up.
+    Returns True for one-dimensional NumPy arrays, which we can look up all
+    at once with vectorized operations.
 
-    Example:
-        >>> OrderedSet([1, 1, 2, 3, 2])
-        OrderedSet([1, 2, 3])
+    We don't import NumPy to check this. If it hasn't been imported yet,
+    `obj` can't be an array.
     """
+    np = sys.modules.get("numpy")
+    return np is not None and isinstance(obj, np.ndarray) and obj.ndim == 1
 
-    def __init__(self, initial: OrderedSetInitializer[T] = None):
-        self.items: List[T] = []
-        self.map: Dict[T, int] = {}
-        if initial is not None:
-            # In terms of duck-typing, the default __ior__ is compatible with
-            # the types we use, but it doesn't expect all the types we
-            # support as values for `initial`.
-            self |= initial  # type: ignore
+
+def _as_lookup(obj: Iterable[T]) -> Union[AbstractSet[T], Dict[T, Any]]:
+    """
+    Get something that can quickly tell whether an item is in `obj`. Sets,
+    including OrderedSets, and dictionaries can already do that, so they're
+    used directly instead of being copied into a new set.
+    """
+    if isinstance(obj, _OrderedSetBase):
+        return obj._lookup()
+    if isinstance(obj, (AbstractSet, dict)):
+        return obj
+    return set(obj)
+
+
+def _as_list(obj: object) -> Optional[list]:
+    """
+    Get the list that an object stores its items in, if it's a list or an
+    OrderedSet, so its items can be compared all at once.
+
+    A DictOrderedSet doesn't necessarily have a list, so we don't make it
+    build one.
+    """
+    if type(obj) is list:
+        return obj  # type: ignore
+    if isinstance(obj, _OrderedSetBase) and not isinstance(obj, DictOrderedSet):
+        return obj.items
+    return None
+
+
+def _same(item1: object, item2: object) -> bool:
+    # The same comparison that lists do on their items.
+    return item1 is item2 or item1 == item2
+
+
+class _OrderedSetCore:
+    """
+    The methods of OrderedSet that are called most often, which look things
+    up in its storage.
+
+    The optional extension module `ordered_set._speedups` provides a compiled
+    version of this class with the same behavior, which is used instead when
+    it's available. Set the environment variable `ORDERED_SET_PURE_PYTHON` to
+    use this pure-Python version anyway.
+    """
+
+    __slots__ = ("_items", "_map", "_holes")
+    _items: List[Any]
+    _map: Dict[Any, int]
+    _holes: List[int]
 
     def __len__(self) -> int:
         """
@@ -81,7 +173,7 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> len(OrderedSet([1, 2]))
             2
         """
-        return len(self.items)
+        return len(self._map)
 
     @overload
     def __getitem__(self, index: slice) -> "OrderedSet[T]":
@@ -117,51 +209,20 @@ class OrderedSet(MutableSet[T], Sequence[T]):
         if isinstance(index, slice) and index == SLICE_ALL:
             return self.copy()
         elif isinstance(index, Iterable):
-            return [self.items[i] for i in index]
-        elif isinstance(index, slice) or hasattr(index, "__index__"):
-            result = self.items[index]
-            if isinstance(result, list):
-                return self.__class__(result)
-            else:
-                return result
+            if _is_ndarray(index):
+                return self._take_array(index)
+            if self._holes:
+                return [self._items[self._position(as_index(i))] for i in index]
+            return list(map(self._items.__getitem__, index))
+        elif isinstance(index, slice):
+            return self._slice(index)
+        elif hasattr(index, "__index__"):
+            if self._holes:
+                return self._items[self._position(as_index(index))]
+            return self._items[index]
         else:
             raise TypeError("Don't know how to index an OrderedSet by %r" % index)
 
-    def copy(self) -> "OrderedSet[T]":
-        """
-        Return a shallow copy of this object.
-
-        Example:
-            >>> this = OrderedSet([1, 2, 3])
-            >>> other = this.copy()
-            >>> this == other
-            True
-            >>> this is other
-            False
-        """
-        return self.__class__(self)
-
-    # Define the gritty details of how an OrderedSet is serialized as a pickle.
-    # We leave off type annotations, because the only code that should interact
-    # with these is a generalized tool such as pickle.
-    def __getstate__(self):
-        if len(self) == 0:
-            # In pickle, the state can't be an empty list.
-            # We need to return a truthy value, or else __setstate__ won't be run.
-            #
-            # This could have been done more gracefully by always putting the state
-            # in a tuple, but this way is backwards- and forwards- compatible with
-            # previous versions of OrderedSet.
-            return (None,)
-        else:
-            return list(self)
-
-    def __setstate__(self, state):
-        if state == (None,):
-            self.__init__([])
-        else:
-            self.__init__(state)
-
     def __contains__(self, key: object) -> bool:
         """
         Test if the item is in this ordered set.
@@ -172,7 +233,7 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> 5 in OrderedSet([1, 3, 2])
             False
         """
-        return key in self.map
+        return key in self._map
 
     # Technically type-incompatible with MutableSet, because we return an
     # int instead of nothing. This is also one of the things that makes
@@ -191,32 +252,16 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> print(oset)
             OrderedSet([3])
         """
-        if key not in self.map:
-            self.map[key] = len(self.items)
-            self.items.append(key)
-        return self.map[key]
-
-    append = add
-
-    def update(self, sequence: SetLike[T]) -> int:
-        """
-        Update the set with the given iterable sequence, then return the index
-        of the last element inserted.
-
-        Example:
-            >>> oset = OrderedSet([1, 2, 3])
-            >>> oset.update([3, 1, 5, 1, 4])
-            4
-            >>> print(oset)
-            OrderedSet([1, 2, 3, 5, 4])
-        """
-        item_index = 0
-        try:
-            for item in sequence:
-                item_index = self.add(item)
-        except TypeError:
-            raise ValueError(f"Argument needs to be an iterable, got {type(sequence)}")
-        return item_index
+        pos = self._map.get(key)
+        if pos is None:
+            if self._holes is _SHARED:
+                self._unshare()  # type: ignore
+            self._map[key] = len(self._items)
+            self._items.append(key)
+            return len(self._map) - 1
+        if self._holes:
+            return pos - bisect_left(self._holes, pos)
+        return pos
 
     @overload
     def index(self, key: Sequence[T]) -> List[int]:
@@ -241,63 +286,442 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             1
         """
         if isinstance(key, Iterable) and not _is_atomic(key):
+            if _is_ndarray(key):
+                return self._index_array(key.tolist()).tolist()
             return [self.index(subkey) for subkey in key]
-        return self.map[key]
+        pos = self._map[key]
+        if self._holes:
+            return pos - bisect_left(self._holes, pos)
+        return pos
 
-    # Provide some compatibility with pd.Index
-    get_loc = index
-    get_indexer = index
 
-    def pop(self, index: int = -1) -> T:
+_Core = _OrderedSetCore
+if not TYPE_CHECKING and not os.environ.get("ORDERED_SET_PURE_PYTHON"):
+    try:
+        from ordered_set import _speedups
+    except ImportError:
+        pass
+    else:
+        _speedups.register_fallbacks(_OrderedSetCore)
+        _Core = _speedups.OrderedSetCore
+
+
+class _OrderedSetBase(_Core, AbstractSet[T], Sequence[T]):
+    """
+    The parts of OrderedSet that don't modify the set, which it shares with
+    FrozenOrderedSet.
+    """
+
+    __slots__ = ("__weakref__",)
+
+    def __init__(self, initial: OrderedSetInitializer[T] = None):
+        self._items = []
+        self._map = {}
+        # The sorted positions in `_items` that hold a placeholder.
+        self._holes = []
+        if initial is not None:
+            self._extend(initial)
+
+    @property
+    def items(self) -> List[T]:
         """
-        Remove and return item at index (default last).
+        The list of items in this OrderedSet, in order.
 
-        Raises KeyError if the set is empty.
-        Raises IndexError if index is out of range.
+        This is the underlying storage, so it should not be modified directly.
+        """
+        self._compact()
+        return self._items
+
+    @property
+    def map(self) -> Dict[T, int]:
+        """
+        The dictionary mapping each item to its index.
+
+        This is the underlying storage, so it should not be modified directly.
+        """
+        self._compact()
+        return self._map
+
+    def _compact(self) -> None:
+        """
+        Squeeze the placeholders left by removed items out of `_items`, and
+        renumber the items that move as a result.
+        """
+        if not self._holes:
+            return
+        start = self._holes[0]
+        items = self._items
+        items[start:] = filter(_is_live, items[start:])
+        self._map.update(zip(items[start:], range(start, len(items))))
+        self._holes = []
+
+    def _unshare(self) -> None:
+        """
+        Before modifying the storage, make a copy of it if it's shared with
+        another OrderedSet.
+        """
+        if self._holes is _SHARED:
+            self._items = list(self._items)
+            self._map = self._map.copy()
+            self._holes = []
+
+    def _position(self, index: int) -> int:
+        """
+        Find where the item with the given index is stored in `_items`,
+        skipping over placeholders. Negative indices count from the end.
+
+        This takes O(log H) time when there are H placeholders, and O(1) time
+        when all the placeholders come before all the items, which is what
+        happens when the OrderedSet is used as a queue.
+        """
+        size = len(self._map)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("OrderedSet index out of range")
+        holes = self._holes
+        if not holes:
+            return index
+        if holes[-1] == len(holes) - 1:
+            return index + len(holes)
+        # holes[j] - j is the number of items stored before the j-th
+        # placeholder, which never decreases as j increases. The item we want
+        # comes after every placeholder where that number is <= index.
+        lo, hi = 0, len(holes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if holes[mid] - mid <= index:
+                lo = mid + 1
+            else:
+                hi = mid
+        return index + lo
+
+    def copy(self) -> "OrderedSet[T]":
+        """
+        Return a shallow copy of this object.
 
         Example:
-            >>> oset = OrderedSet([1, 2, 3])
-            >>> oset.pop()
-            3
+            >>> this = OrderedSet([1, 2, 3])
+            >>> other = this.copy()
+            >>> this == other
+            True
+            >>> this is other
+            False
         """
-        if not self.items:
-            raise KeyError("Set is empty")
+        return self.__class__(self)
 
-        elem = self.items[index]
-        del self.items[index]
-        del self.map[elem]
-        return elem
+    def _slice(self, index: slice) -> "OrderedSet[T]":
+        """
+        Get a slice of this set as a new set of the same type.
+        """
+        self._compact()
+        return self.__class__(self._items[index])
 
-    def discard(self, key: T) -> None:
+    # Define the gritty details of how an OrderedSet is serialized as a pickle.
+    # We leave off type annotations, because the only code that should interact
+    # with these is a generalized tool such as pickle.
+    def __getstate__(self):
+        if len(self) == 0:
+            # In pickle, the state can't be an empty list.
+            # We need to return a truthy value, or else __setstate__ won't be run.
+            #
+            # This could have been done more gracefully by always putting the state
+            # in a tuple, but this way is backwards- and forwards- compatible with
+            # previous versions of OrderedSet.
+            return (None,)
+        else:
+            return list(self)
+
+    def __setstate__(self, state):
+        self.__init__()
+        if state != (None,):
+            self._restore(state)
+
+    def _restore(self, items: List[T]) -> None:
         """
-        Remove an element.  Do not raise an exception if absent.
+        Fill an empty set with a list of items that was saved from a set, so
+        it shouldn't have duplicates.
 
-        The MutableSet mixin uses this to implement the .remove() method, which
-        *does* raise an error when asked to remove a non-existent item.
+        Instead of adding the items one by one, this makes the dictionary of
+        indices all at once, and only has to remove duplicates if the size of
+        the dictionary shows that there are some.
+        """
+        if type(items) is not list:
+            items = list(items)
+        index = dict(zip(items, range(len(items))))
+        if len(index) < len(items):
+            self._extend(items)
+        else:
+            self._items = items
+            self._map = index
+
+    def _lookup(self) -> Union[Dict[T, Any], List[T]]:
+        """
+        Get the container that `__contains__` checks, so that other sets can
+        check it directly, which is faster than calling `__contains__`.
+        """
+        return self._map
+
+    @classmethod
+    def _from_unique(cls, items: Iterable[T]) -> "OrderedSet[T]":
+        """
+        Make a set from items that are known not to have duplicates, such as
+        some of the items of another set.
+        """
+        result = cls()
+        result._restore(list(items))
+        return result
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize this set in a compact binary format, which can be read by
+        `.from_bytes()`. The items must all be strings, all be bytes, or all
+        be integers that fit in 64 bits.
+
+        The format is versioned, and smaller and faster to load than a
+        pickle: strings and bytes are stored back to back, separated by null
+        characters if none of them contain one, and integers are stored as
+        an array of 64-bit integers.
 
         Example:
-            >>> oset = OrderedSet([1, 2, 3])
-            >>> oset.discard(2)
-            >>> print(oset)
-            OrderedSet([1, 3])
-            >>> oset.discard(2)
-            >>> print(oset)
-            OrderedSet([1, 3])
+            >>> data = OrderedSet(["a", "b", "c"]).to_bytes()
+            >>> OrderedSet.from_bytes(data)
+            OrderedSet(['a', 'b', 'c'])
+        """
+        items = list(self)
+        types = set(map(type, items))
+        lengths = array(_UINT32)
+        data: Any
+        if types <= {str} or types == {bytes}:
+            is_str = types <= {str}
+            sep = "\0" if is_str else b"\0"
+            data = sep.join(items)  # type: ignore
+            if data.count(sep) == len(items) - 1:
+                code = b"s" if is_str else b"b"
+            else:
+                # Some items contain the separator, so store their lengths
+                # instead.
+                code = b"S" if is_str else b"B"
+                lengths.extend(map(len, items))
+                data = sep[:0].join(items)  # type: ignore
+            if is_str:
+                data = data.encode("utf-8", "surrogatepass")
+        elif types == {int}:
+            code = b"i"
+            try:
+                data = array("q", items)  # type: ignore
+            except OverflowError:
+                raise ValueError("Integers must fit in 64 bits to be serialized")
+            if sys.byteorder == "big":
+                data.byteswap()
+            data = data.tobytes()
+        else:
+            raise ValueError(
+                "Only sets of strings, bytes, or integers can be serialized, "
+                f"not {', '.join(sorted(t.__name__ for t in types))}"
+            )
+        if sys.byteorder == "big":
+            lengths.byteswap()
+        header = _BYTES_HEADER.pack(_BYTES_MAGIC, _BYTES_VERSION, code, len(items))
+        return header + lengths.tobytes() + data
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "OrderedSet[Any]":
         """
-        if key in self:
-            i = self.map[key]
-            del self.items[i]
-            del self.map[key]
-            for k, v in self.map.items():
-                if v >= i:
-                    self.map[k] = v - 1
+        Load a set that was serialized by `.to_bytes()`.
 
-    def clear(self) -> None:
+        Raises ValueError if the data isn't in a format this version knows.
         """
-        Remove all items from this OrderedSet.
+        data = memoryview(data).cast("B")
+        try:
+            magic, version, code, count = _BYTES_HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError("Data is too short to be a serialized OrderedSet")
+        if magic != _BYTES_MAGIC:
+            raise ValueError("Data is not a serialized OrderedSet")
+        if version != _BYTES_VERSION:
+            raise ValueError(f"Unknown OrderedSet format version {version}")
+
+        start = _BYTES_HEADER.size
+        content: Any
+        items: List[Any]
+        if code == b"i":
+            values = array("q")
+            values.frombytes(data[start:])
+            if sys.byteorder == "big":
+                values.byteswap()
+            items = values.tolist()
+        elif code in b"sbSB":
+            lengths = array(_UINT32)
+            if code in b"SB":
+                lengths.frombytes(data[start:start + lengths.itemsize * count])
+                start += lengths.itemsize * count
+                if sys.byteorder == "big":
+                    lengths.byteswap()
+            if code in b"sS":
+                content = str(data[start:], "utf-8", "surrogatepass")
+            else:
+                content = bytes(data[start:])
+            if code in b"sb":
+                sep = "\0" if code == b"s" else b"\0"
+                items = content.split(sep) if count else []
+            else:
+                ends = list(it.accumulate(lengths))
+                if ends and ends[-1] != len(content):
+                    raise ValueError("Serialized OrderedSet has the wrong length")
+                items = list(map(content.__getitem__, map(slice, [0] + ends, ends)))
+        else:
+            raise ValueError(f"Unknown OrderedSet item type {code!r}")
+        if len(items) != count:
+            raise ValueError("Serialized OrderedSet has the wrong length")
+        result = cls()
+        result._restore(items)
+        return result
+
+    def __reduce_ex__(self, protocol):
+        if protocol < 2:
+            # This is what `object` does by default, except that its default
+            # can't tell that the compiled OrderedSetCore has no state of its
+            # own to save.
+            return (copyreg._reconstructor, (self.__class__, object, None), self.__getstate__())
+        return super().__reduce_ex__(protocol)
+
+    def _extend(self, iterable: OrderedSetInitializer[T]) -> None:
+        """
+        Add all the items from an iterable, in bulk.
+
+        Instead of calling `.add()` for each item, this removes duplicates
+        with `dict.fromkeys`, skips the ones we already have, and appends the
+        rest to the list and the map all at once, so the work is done in C.
+        Duplicates don't have to be removed at all when `iterable` is a set,
+        mapping, or OrderedSet, and copying another OrderedSet into an empty
+        one just copies its storage.
+        """
+        self._unshare()
+        items = self._items
+        if not items and isinstance(iterable, _OrderedSetBase):
+            self._items = list(iterable.items)
+            self._map = iterable.map.copy()
+            return
+        new_items: Iterable[T]
+        if isinstance(iterable, (AbstractSet, dict)):
+            new_items = iterable
+        else:
+            new_items = dict.fromkeys(iterable)
+        if self._map:
+            new_items = list(it.filterfalse(self._map.__contains__, new_items))
+        start = len(items)
+        items.extend(new_items)
+        self._map.update(zip(items[start:], range(start, len(items))))
+
+    # Provide some compatibility with pd.Index
+    get_loc = _Core.index
+
+    def get_indexer(self, keys):
+        """
+        Get the indices of an iterable of keys, like `.index()` does.
+
+        If `keys` is a NumPy array, this returns a NumPy array of indices,
+        with -1 for the keys that aren't present, just like
+        `pandas.Index.get_indexer`. The lookup is done all at once.
+
+        Example:
+            >>> oset = OrderedSet(["a", "b", "c"])
+            >>> oset.get_indexer(["c", "a"])
+            [2, 0]
+        """
+        if _is_ndarray(keys):
+            return self.index_many(keys)
+        return self.index(keys)
+
+    def index_many(self, keys: Iterable[T], missing: int = -1, add_missing: bool = False):
+        """
+        Get the index of each key in an iterable, in a single pass. Keys that
+        aren't present get the index `missing`, instead of raising an error.
+
+        If `add_missing` is True, keys that aren't present are added to the
+        end of the OrderedSet instead, and get their new indices.
+
+        Unlike `.index()`, each key is looked up as a single item, even if
+        it's iterable. If `keys` is a NumPy array, this returns an int64
+        array of indices, otherwise it returns a list.
+
+        Example:
+            >>> oset = OrderedSet(["a", "b", "c"])
+            >>> oset.index_many(["c", "x", "a"])
+            [2, -1, 0]
+            >>> oset.index_many(["c", "x", "y", "x"], add_missing=True)
+            [2, 3, 4, 3]
+            >>> oset
+            OrderedSet(['a', 'b', 'c', 'x', 'y'])
         """
-        del self.items[:]
-        self.map.clear()
+        if _is_ndarray(keys):
+            key_list = keys.tolist()  # type: ignore
+            if add_missing:
+                self._extend(key_list)
+                return self._index_array(key_list)
+            return self._index_array(key_list, missing)
+
+        holes = self._holes
+        if add_missing:
+            if not isinstance(keys, (list, tuple)):
+                keys = list(keys)
+            self._extend(keys)
+            positions = list(map(self._map.__getitem__, keys))
+            if holes:
+                return [pos - bisect_left(holes, pos) for pos in positions]
+            return positions
+        if holes:
+            return [
+                missing if pos is None else pos - bisect_left(holes, pos)
+                for pos in map(self._map.get, keys)
+            ]
+        return list(map(self._map.get, keys, it.repeat(missing)))
+
+    def _take_array(self, indices) -> List[T]:
+        """
+        Get the items at the indices in a NumPy array, all at once.
+        """
+        if self._holes:
+            indices = self._positions_array(indices)
+        return list(map(self._items.__getitem__, indices.tolist()))
+
+    def _positions_array(self, indices):
+        """
+        The vectorized version of `._position()`, converting a NumPy array of
+        indices into positions in `_items`.
+        """
+        np = sys.modules["numpy"]
+        size = len(self._map)
+        indices = np.asarray(indices, dtype=np.intp)
+        indices = np.where(indices < 0, indices + size, indices)
+        if len(indices) and (indices.min() < 0 or indices.max() >= size):
+            raise IndexError("OrderedSet index out of range")
+        holes = np.asarray(self._holes, dtype=np.intp)
+        live_before = holes - np.arange(len(holes))
+        return indices + np.searchsorted(live_before, indices, side="right")
+
+    def _index_array(self, keys: list, missing: Optional[int] = None):
+        """
+        Get the indices of a list of keys (converted from a NumPy array) all
+        at once, as an int64 array.
+
+        If `missing` is None, missing keys raise a KeyError. Otherwise, their
+        index is `missing`.
+        """
+        np = sys.modules["numpy"]
+        if missing is None:
+            found = map(self._map.__getitem__, keys)
+        else:
+            found = map(self._map.get, keys, it.repeat(-1))
+        positions = np.fromiter(found, dtype=np.int64, count=len(keys))
+        absent = positions < 0
+        if self._holes:
+            present = ~absent
+            positions[present] -= np.searchsorted(self._holes, positions[present])
+        if missing is not None and missing != -1:
+            positions[absent] = missing
+        return positions
 
     def __iter__(self) -> Iterator[T]:
         """
@@ -305,7 +729,9 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> list(iter(OrderedSet([1, 2, 3])))
             [1, 2, 3]
         """
-        return iter(self.items)
+        if self._holes:
+            return filter(_is_live, self._items)
+        return iter(self._items)
 
     def __reversed__(self) -> Iterator[T]:
         """
@@ -313,7 +739,9 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> list(reversed(OrderedSet([1, 2, 3])))
             [3, 2, 1]
         """
-        return reversed(self.items)
+        if self._holes:
+            return filter(_is_live, reversed(self._items))
+        return reversed(self._items)
 
     def __repr__(self) -> str:
         if not self:
@@ -339,14 +767,20 @@ class OrderedSet(MutableSet[T], Sequence[T]):
         if isinstance(other, Sequence):
             # Check that this OrderedSet contains the same elements, in the
             # same order, as the other object.
-            return list(self) == list(other)
-        try:
-            other_as_set = set(other)
-        except TypeError:
-            # If `other` can't be converted into a set, it's not equal.
-            return False
-        else:
-            return set(self) == other_as_set
+            if len(self) != len(other):
+                return False
+            items1 = _as_list(self)
+            items2 = _as_list(other)
+            if items1 is not None and items2 is not None:
+                return items1 == items2
+            return all(map(_same, self, other))
+        if not isinstance(other, AbstractSet):
+            try:
+                other = set(other)  # type: ignore
+            except TypeError:
+                # If `other` can't be converted into a set, it's not equal.
+                return False
+        return len(self) == len(other) and all(map(other.__contains__, self))  # type: ignore
 
     def union(self, *sets: SetLike[T]) -> "OrderedSet[T]":
         """
@@ -363,11 +797,13 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             OrderedSet([3, 1, 4, 5, 2, 0, 10])
         """
         cls: type = OrderedSet
-        if isinstance(self, OrderedSet):
+        if isinstance(self, _OrderedSetBase):
             cls = self.__class__
-        containers = map(list, it.chain([self], sets))
-        items = it.chain.from_iterable(containers)
-        return cls(items)
+        result = cls()
+        result._extend(self)
+        for other in sets:
+            result._extend(other)
+        return result
 
     def __and__(self, other: SetLike[T]) -> "OrderedSet[T]":
         # the parent implementation of this is backwards
@@ -388,13 +824,35 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             OrderedSet([1, 2, 3])
         """
         cls: type = OrderedSet
-        items: OrderedSetInitializer[T] = self
-        if isinstance(self, OrderedSet):
+        if isinstance(self, _OrderedSetBase):
             cls = self.__class__
-        if sets:
-            common = set.intersection(*map(set, sets))
-            items = (item for item in self if item in common)
-        return cls(items)
+            return cls._from_unique(self._intersection_items(sets))
+        return cls._from_unique(OrderedSet(self)._intersection_items(sets))
+
+    def _intersection_items(self, sets: Sequence[SetLike[T]]) -> Iterable[T]:
+        """
+        Get the items of this set that are in all of the `sets`, in order.
+
+        The other sets are probed directly if they're sets or OrderedSets.
+        When one of them is much smaller than this set, this iterates over it
+        instead of this set, and then puts the items it finds back in order
+        by their positions here.
+        """
+        lookups = list(map(_as_lookup, sets))
+        if not lookups:
+            return self
+        smallest = min(lookups, key=len)
+        if len(smallest) * 8 >= len(self):
+            return self.iter_intersection(*lookups)
+        index = self._map
+        positions = sorted(
+            index[item]
+            for item in smallest
+            if item in index and all(item in lookup for lookup in lookups)
+        )
+        # Use our own items, which may be equal to the other set's items
+        # without being identical.
+        return list(map(self._items.__getitem__, positions))
 
     def difference(self, *sets: SetLike[T]) -> "OrderedSet[T]":
         """
@@ -410,12 +868,68 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> OrderedSet([1, 2, 3]).difference()
             OrderedSet([1, 2, 3])
         """
-        cls = self.__class__
-        items: OrderedSetInitializer[T] = self
-        if sets:
-            other = set.union(*map(set, sets))
-            items = (item for item in self if item not in other)
-        return cls(items)
+        return self._from_unique(self.iter_difference(*sets))
+
+    def iter_union(self, *sets: Iterable[T]) -> Iterator[T]:
+        """
+        Iterate over the items that `.union()` would return, in the same
+        order, without building a new set.
+
+        Only the items that aren't in this set are remembered, to skip their
+        duplicates. The other iterables are read as the result is iterated,
+        so they can be generators.
+
+        Example:
+            >>> oset = OrderedSet([3, 1, 4])
+            >>> list(oset.iter_union([1, 5], (n * 2 for n in range(4))))
+            [3, 1, 4, 5, 0, 2, 6]
+        """
+        yield from self
+        seen: Set[T] = set()
+        lookup = self._lookup()
+        for other in sets:
+            for item in it.filterfalse(lookup.__contains__, other):
+                if item not in seen:
+                    seen.add(item)
+                    yield item
+
+    def iter_intersection(self, *sets: Iterable[T]) -> Iterator[T]:
+        """
+        Iterate over the items that `.intersection()` would return, in the
+        same order, without building a new set.
+
+        Arguments that are sets or OrderedSets are checked directly. Others
+        are turned into sets first, because we have to look things up in
+        them.
+
+        Example:
+            >>> oset = OrderedSet([3, 1, 4, 5])
+            >>> list(oset.iter_intersection({1, 3, 5}, [5, 3]))
+            [3, 5]
+        """
+        items: Iterator[T] = iter(self)
+        for other in sets:
+            items = filter(_as_lookup(other).__contains__, items)
+        return items
+
+    def iter_difference(self, *sets: Iterable[T]) -> Iterator[T]:
+        """
+        Iterate over the items that `.difference()` would return, in the same
+        order, without building a new set.
+
+        Arguments that are sets or OrderedSets are checked directly. Others
+        are turned into sets first, because we have to look things up in
+        them.
+
+        Example:
+            >>> oset = OrderedSet([3, 1, 4, 5])
+            >>> list(oset.iter_difference({1}, [5]))
+            [3, 4]
+        """
+        items: Iterator[T] = iter(self)
+        for other in sets:
+            items = it.filterfalse(_as_lookup(other).__contains__, items)
+        return items
 
     def issubset(self, other: SetLike[T]) -> bool:
         """
@@ -465,27 +979,212 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             OrderedSet([4, 5, 9, 2])
         """
         cls: type = OrderedSet
-        if isinstance(self, OrderedSet):
+        if isinstance(self, _OrderedSetBase):
             cls = self.__class__
         diff1 = cls(self).difference(other)
         diff2 = cls(other).difference(self)
         return diff1.union(diff2)
 
-    def _update_items(self, items: list) -> None:
+
+class OrderedSet(_OrderedSetBase[T], MutableSet[T]):
+    """
+    An OrderedSet is a custom MutableSet that remembers its order, so that
+    every entry has an index that can be looked up.
+
+    Example:
+        >>> OrderedSet([1, 1, 2, 3, 2])
+        OrderedSet([1, 2, 3])
+    """
+
+    __slots__ = ()
+
+    # Removed items leave placeholders behind in `_items`. Once more than this
+    # fraction of the slots are placeholders, they are squeezed out.
+    _compact_ratio = 0.5
+
+    def _delete_slot(self, pos: int) -> None:
         """
-        Replace the 'items' list of this OrderedSet with a new one, updating
-        self.map accordingly.
+        Remove the item stored at position `pos` of `_items`, which must
+        already have been removed from `_map`.
+
+        The slot becomes a placeholder, so the items after it keep their
+        positions until enough placeholders have built up to be worth
+        compacting. This is what makes removal O(1) amortized instead of O(N).
         """
-        self.items = items
-        self.map = {item: idx for (idx, item) in enumerate(items)}
+        items = self._items
+        holes = self._holes
+        if pos == len(items) - 1:
+            # Removing the last slot is free, and so is removing any
+            # placeholders that it leaves at the end of the list.
+            items.pop()
+            while holes and holes[-1] == len(items) - 1:
+                holes.pop()
+                items.pop()
+        else:
+            items[pos] = _DELETED  # type: ignore
+            if not holes or pos > holes[-1]:
+                holes.append(pos)
+            else:
+                insort(holes, pos)
+            if len(holes) > len(items) * self._compact_ratio:
+                self._compact()
 
-    def difference_update(self, *sets: SetLike[T]) -> None:
+    def copy(self) -> "OrderedSet[T]":
         """
-        Update this OrderedSet to remove items from one or more other sets.
+        Return a shallow copy of this object.
+
+        The copy shares its storage with this OrderedSet until one of them
+        is modified, which copies the list and dictionary of the one that's
+        modified, so copying takes O(1) time.
 
         Example:
             >>> this = OrderedSet([1, 2, 3])
-            >>> this.difference_update(OrderedSet([2, 4]))
+            >>> other = this.copy()
+            >>> other.add(4)
+            3
+            >>> this
+            OrderedSet([1, 2, 3])
+        """
+        self._compact()
+        self._holes = _SHARED
+        result = self.__class__()
+        result._items = self._items
+        result._map = self._map
+        result._holes = _SHARED
+        return result
+
+    append = _Core.add
+
+    def update(self, sequence: SetLike[T]) -> int:
+        """
+        Update the set with the given iterable sequence, then return the index
+        of the last element inserted.
+
+        Example:
+            >>> oset = OrderedSet([1, 2, 3])
+            >>> oset.update([3, 1, 5, 1, 4])
+            4
+            >>> print(oset)
+            OrderedSet([1, 2, 3, 5, 4])
+        """
+        try:
+            if not isinstance(sequence, (list, tuple, _OrderedSetBase)):
+                # We need to know which item came last, so materialize
+                # iterators and unordered collections as a list.
+                sequence = list(sequence)
+            self._extend(sequence)
+        except TypeError:
+            raise ValueError(f"Argument needs to be an iterable, got {type(sequence)}")
+        if not sequence:
+            return 0
+        return self.index(sequence[-1])
+
+    def __ior__(self, other: SetLike[T]) -> "OrderedSet[T]":  # type: ignore
+        self._extend(other)
+        return self
+
+    def pop(self, index: int = -1) -> T:
+        """
+        Remove and return item at index (default last). The items after it
+        move down by one index.
+
+        Raises KeyError if the set is empty.
+        Raises IndexError if index is out of range.
+
+        Example:
+            >>> oset = OrderedSet([1, 2, 3])
+            >>> oset.pop()
+            3
+            >>> oset.pop(0)
+            1
+            >>> oset.index(2)
+            0
+        """
+        if not self._map:
+            raise KeyError("Set is empty")
+
+        self._unshare()
+        pos = self._position(as_index(index))
+        elem = self._items[pos]
+        del self._map[elem]
+        self._delete_slot(pos)
+        return elem
+
+    def popleft(self) -> T:
+        """
+        Remove and return the first item. This takes O(1) amortized time, so
+        an OrderedSet can be used as a first-in, first-out queue that ignores
+        duplicates.
+
+        Raises KeyError if the set is empty.
+
+        Example:
+            >>> oset = OrderedSet([1, 2, 3])
+            >>> oset.popleft()
+            1
+            >>> oset.add(1)
+            2
+        """
+        return self.pop(0)
+
+    def discard(self, key: T) -> None:
+        """
+        Remove an element.  Do not raise an exception if absent.
+
+        The MutableSet mixin uses this to implement the .remove() method, which
+        *does* raise an error when asked to remove a non-existent item.
+
+        Example:
+            >>> oset = OrderedSet([1, 2, 3])
+            >>> oset.discard(2)
+            >>> print(oset)
+            OrderedSet([1, 3])
+            >>> oset.discard(2)
+            >>> print(oset)
+            OrderedSet([1, 3])
+        """
+        self._unshare()
+        pos = self._map.pop(key, None)
+        if pos is not None:
+            self._delete_slot(pos)
+
+    def clear(self) -> None:
+        """
+        Remove all items from this OrderedSet.
+        """
+        self._items = []
+        self._map = {}
+        self._holes = []
+
+    def _update_items(self, items: list) -> None:
+        """
+        Replace the 'items' list of this OrderedSet with a new one, updating
+        self.map accordingly.
+        """
+        self._items = items
+        self._map = {item: idx for (idx, item) in enumerate(items)}
+        self._holes = []
+
+    def _discard_all(self, items: Iterable[T]) -> None:
+        """
+        Remove each of the given items that is present. Removal leaves
+        placeholders instead of renumbering the other items, so this takes
+        time proportional to the number of items, not the size of the set.
+        """
+        discard = self.discard
+        for item in items:
+            discard(item)
+
+    def difference_update(self, *sets: SetLike[T]) -> None:
+        """
+        Update this OrderedSet to remove items from one or more other sets.
+
+        This takes time proportional to the size of the other sets, or of
+        this set if it's smaller than another set that can look up items.
+
+        Example:
+            >>> this = OrderedSet([1, 2, 3])
+            >>> this.difference_update(OrderedSet([2, 4]))
             >>> print(this)
             OrderedSet([1, 3])
 
@@ -494,17 +1193,23 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> print(this)
             OrderedSet([3, 5])
         """
-        items_to_remove = set()  # type: Set[T]
         for other in sets:
-            items_as_set = set(other)  # type: Set[T]
-            items_to_remove |= items_as_set
-        self._update_items([item for item in self.items if item not in items_to_remove])
+            if other is self:
+                self.clear()
+            elif isinstance(other, (AbstractSet, dict)) and len(other) > len(self):
+                self._discard_all(list(filter(_as_lookup(other).__contains__, self)))
+            else:
+                self._discard_all(other)
 
     def intersection_update(self, other: SetLike[T]) -> None:
         """
         Update this OrderedSet to keep only items in another set, preserving
         their order in this set.
 
+        This checks every item of this set, but only changes the ones that
+        are removed, unless the other set is so much smaller that the result
+        is quicker to build from scratch.
+
         Example:
             >>> this = OrderedSet([1, 4, 3, 5, 7])
             >>> other = OrderedSet([9, 7, 1, 3, 2])
@@ -512,14 +1217,19 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> print(this)
             OrderedSet([1, 3, 7])
         """
-        other = set(other)
-        self._update_items([item for item in self.items if item in other])
+        lookup = _as_lookup(other)
+        if len(lookup) * 8 < len(self):
+            self._update_items(list(self._intersection_items([lookup])))
+        else:
+            self._discard_all(list(it.filterfalse(lookup.__contains__, self)))
 
     def symmetric_difference_update(self, other: SetLike[T]) -> None:
         """
         Update this OrderedSet to remove items from another set, then
         add items from the other set that were not present in this set.
 
+        This takes time proportional to the size of the other set.
+
         Example:
             >>> this = OrderedSet([1, 4, 3, 5, 7])
             >>> other = OrderedSet([9, 7, 1, 3, 2])
@@ -527,8 +1237,789 @@ class OrderedSet(MutableSet[T], Sequence[T]):
             >>> print(this)
             OrderedSet([4, 5, 9, 2])
         """
-        items_to_add = [item for item in other if item not in self]
-        items_to_remove = set(other)
-        self._update_items(
-            [item for item in self.items if item not in items_to_remove] + items_to_add
+        if other is self:
+            self.clear()
+            return
+        if not isinstance(other, (AbstractSet, dict)):
+            # Remove duplicates, keeping the order of the items to add.
+            other = dict.fromkeys(other)  # type: ignore
+        lookup = self._lookup()
+        items_to_remove = list(filter(lookup.__contains__, other))
+        items_to_add = list(it.filterfalse(lookup.__contains__, other))
+        self._discard_all(items_to_remove)
+        self._extend(items_to_add)
+
+
+class FrozenOrderedSet(_OrderedSetBase[T]):
+    """
+    An immutable, hashable OrderedSet, which can be used as a dictionary key
+    or a member of another set.
+
+    Because it can't change, copying it returns the same object, and
+    FrozenOrderedSets made from it share its storage. Slices and set
+    operations return the same set, or share the dictionary of indices,
+    when they can tell that the result is the same set or a prefix of it.
+
+    Example:
+        >>> fset = FrozenOrderedSet(["a", "b", "c"])
+        >>> {fset: 1}[FrozenOrderedSet("abc")]
+        1
+        >>> fset[:2]
+        FrozenOrderedSet(['a', 'b'])
+        >>> fset.copy() is fset
+        True
+    """
+
+    __slots__ = ("_hash",)
+
+    def __init__(self, initial: OrderedSetInitializer[T] = None):
+        self._hash: Optional[int] = None
+        if isinstance(initial, FrozenOrderedSet):
+            # Nothing can change either set, so they can share storage.
+            self._items = initial._items
+            self._map = initial._map
+            self._holes = []
+        else:
+            super().__init__(initial)
+
+    @classmethod
+    def _from_storage(cls, items: List[T], index: Dict[T, int]) -> "FrozenOrderedSet[T]":
+        """
+        Make a FrozenOrderedSet directly from a list of unique items and the
+        dictionary of their indices.
+        """
+        result = cls.__new__(cls)
+        result._hash = None
+        result._items = items
+        result._map = index
+        result._holes = []
+        return result
+
+    def __hash__(self) -> int:
+        # Equal sets have to have equal hashes, and a FrozenOrderedSet can be
+        # equal to a frozenset, so this has to be the frozenset's hash.
+        if self._hash is None:
+            self._hash = hash(frozenset(self._items))
+        return self._hash
+
+    def add(self, key: T) -> int:
+        raise TypeError("FrozenOrderedSet is immutable")
+
+    def index_many(self, keys: Iterable[T], missing: int = -1, add_missing: bool = False):
+        if add_missing:
+            raise TypeError("FrozenOrderedSet is immutable")
+        return super().index_many(keys, missing)
+
+    def copy(self) -> "FrozenOrderedSet[T]":
+        return self
+
+    def _prefix(self, size: int) -> "FrozenOrderedSet[T]":
+        """
+        Get the first `size` items as a FrozenOrderedSet, without re-hashing
+        more than half of the items.
+
+        The items keep the same indices in a prefix, so when it's most of the
+        set, the dictionary of indices can be copied and have the rest of the
+        items deleted from it.
+        """
+        if size >= len(self._items):
+            return self
+        items = self._items[:size]
+        if size * 2 >= len(self._items):
+            index = self._map.copy()
+            for item in self._items[size:]:
+                del index[item]
+        else:
+            index = dict(zip(items, range(size)))
+        return self._from_storage(items, index)
+
+    def _subset(self, items: List[T]) -> "FrozenOrderedSet[T]":
+        """
+        Make a FrozenOrderedSet from a list of some of the items in this set,
+        in order.
+        """
+        if len(items) == len(self._items):
+            return self
+        if not items or self._map[items[-1]] == len(items) - 1:
+            # The items are in order, so if the last one is where it would be
+            # in a prefix, they're all a prefix.
+            return self._prefix(len(items))
+        return self._from_storage(items, dict(zip(items, range(len(items)))))
+
+    def _slice(self, index: slice) -> "FrozenOrderedSet[T]":
+        start, stop, step = index.indices(len(self._items))
+        if start == 0 and step == 1:
+            return self._prefix(max(stop, 0))
+        return super()._slice(index)  # type: ignore
+
+    def union(self, *sets: SetLike[T]) -> "FrozenOrderedSet[T]":
+        if all(isinstance(other, AbstractSet) and other <= self for other in sets):
+            return self
+        return super().union(*sets)  # type: ignore
+
+    def __or__(self, other: SetLike[T]) -> "FrozenOrderedSet[T]":  # type: ignore
+        return self.union(other)
+
+    def __sub__(self, other: SetLike[T]) -> "FrozenOrderedSet[T]":  # type: ignore
+        return self.difference(other)
+
+    def intersection(self, *sets: SetLike[T]) -> "FrozenOrderedSet[T]":
+        return self._subset(list(self._intersection_items(sets)))
+
+    def difference(self, *sets: SetLike[T]) -> "FrozenOrderedSet[T]":
+        return self._subset(list(self.iter_difference(*sets)))
+
+
+class CompactOrderedSet(OrderedSet[T]):
+    """
+    An OrderedSet that takes up less memory when it's small, for programs
+    that keep many small OrderedSets around.
+
+    Until it has more than a handful of items, a CompactOrderedSet keeps its
+    items in a list and finds them by linear search, without the dictionary
+    that maps items to indices. It builds that dictionary when it grows
+    larger, or when an operation it doesn't optimize needs it, and from then
+    on it works like a regular OrderedSet.
+
+    Example:
+        >>> oset = CompactOrderedSet(["a", "b"])
+        >>> oset.add("c")
+        2
+        >>> oset.index("b")
+        1
+        >>> oset
+        CompactOrderedSet(['a', 'b', 'c'])
+    """
+
+    __slots__ = ("_table",)
+
+    # The largest size at which we search the list instead of hashing.
+    _linear_limit = 8
+
+    def __init__(self, initial: OrderedSetInitializer[T] = None):
+        self._items = []
+        # None means we haven't built the dictionary of indices.
+        self._table: Optional[Dict[T, int]] = None
+        # An empty tuple takes no memory of its own, unlike an empty list.
+        # Removed items only leave placeholders once there is a dictionary.
+        self._holes = ()  # type: ignore
+        if initial is not None:
+            self._extend(initial)
+
+    # Everything in OrderedSet that uses `_map` gets the dictionary, building
+    # it first if necessary. The methods below avoid that for small sets.
+    @property  # type: ignore
+    def _map(self) -> Dict[T, int]:  # type: ignore
+        if self._table is None:
+            self._build_table()
+        return self._table  # type: ignore
+
+    def _build_table(self) -> None:
+        """
+        Switch to storing a dictionary of indices, like OrderedSet.
+        """
+        self._table = dict(zip(self._items, range(len(self._items))))
+        self._holes = []
+
+    @_map.setter
+    def _map(self, table: Dict[T, int]) -> None:
+        self._table = table
+
+    @property
+    def map(self) -> Dict[T, int]:
+        if self._table is None:
+            return dict(zip(self._items, range(len(self._items))))
+        return OrderedSet.map.fget(self)  # type: ignore
+
+    def __len__(self) -> int:
+        if self._table is None:
+            return len(self._items)
+        return len(self._table)
+
+    def __contains__(self, key: object) -> bool:
+        if self._table is None:
+            hash(key)
+            return key in self._items
+        return key in self._table
+
+    def _lookup(self) -> Union[Dict[T, int], List[T]]:  # type: ignore
+        if self._table is None:
+            return self._items
+        return self._table
+
+    __getitem__ = _OrderedSetCore.__getitem__
+    # Copies are made the usual way, without sharing storage.
+    copy = _OrderedSetBase.copy
+
+    def add(self, key: T) -> int:
+        if self._table is None:
+            items = self._items
+            hash(key)
+            try:
+                return items.index(key)
+            except ValueError:
+                items.append(key)
+                if len(items) > self._linear_limit:
+                    self._build_table()
+                return len(items) - 1
+        return _OrderedSetCore.add(self, key)
+
+    append = add
+
+    def index(self, key):
+        if self._table is None:
+            if not _is_atomic(key) and isinstance(key, Iterable):
+                return [self.index(subkey) for subkey in key]
+            hash(key)
+            try:
+                return self._items.index(key)
+            except ValueError:
+                raise KeyError(key) from None
+        return _OrderedSetCore.index(self, key)
+
+    get_loc = index
+
+    def _extend(self, iterable: OrderedSetInitializer[T]) -> None:
+        if self._table is None:
+            items = self._items
+            if items:
+                new_items = [item for item in dict.fromkeys(iterable) if item not in items]
+            else:
+                new_items = list(dict.fromkeys(iterable))
+            if len(items) + len(new_items) <= self._linear_limit:
+                if items:
+                    items.extend(new_items)
+                else:
+                    # This list has no room to grow, so it's smaller.
+                    self._items = new_items
+                return
+            iterable = new_items
+        super()._extend(iterable)
+
+    def pop(self, index: int = -1) -> T:
+        if self._table is None:
+            if not self._items:
+                raise KeyError("Set is empty")
+            return self._items.pop(index)
+        return super().pop(index)
+
+    def discard(self, key: T) -> None:
+        if self._table is None:
+            hash(key)
+            try:
+                self._items.remove(key)
+            except ValueError:
+                pass
+        else:
+            super().discard(key)
+
+    def clear(self) -> None:
+        self._items = []
+        self._table = None
+        self._holes = ()  # type: ignore
+
+    def _restore(self, items: List[T]) -> None:
+        self._extend(items)
+
+    def _update_items(self, items: list) -> None:
+        if len(items) <= self._linear_limit:
+            self._items = items
+            self._table = None
+            self._holes = ()  # type: ignore
+        else:
+            super()._update_items(items)
+
+
+class DictOrderedSet(OrderedSet[T]):
+    """
+    An OrderedSet that stores its items only as the keys of an
+    insertion-ordered dictionary, which takes less memory than OrderedSet's
+    list and dictionary of indices when you mostly add items, check whether
+    items are present, and iterate.
+
+    The list of items and the dictionary of indices that OrderedSet keeps are
+    built the first time they're needed, such as when looking up an item by
+    its index or looking up the index of an item. Adding items keeps them up
+    to date. Removing an item discards them, to be rebuilt when they're
+    needed again.
+
+    Example:
+        >>> oset = DictOrderedSet(["a", "b", "c"])
+        >>> "b" in oset
+        True
+        >>> oset.discard("b")
+        >>> oset[1]
+        'c'
+        >>> oset
+        DictOrderedSet(['a', 'c'])
+    """
+
+    __slots__ = ("_keys", "_list", "_index")
+
+    def __init__(self, initial: OrderedSetInitializer[T] = None):
+        self._keys: Dict[T, None] = {}
+        # The list of items and the dictionary of indices, if they've been
+        # built. They never contain placeholders.
+        self._list: Optional[List[T]] = None
+        self._index: Optional[Dict[T, int]] = None
+        self._holes = ()  # type: ignore
+        if initial is not None:
+            self._extend(initial)
+
+    # Everything in OrderedSet that uses `_items` or `_map` gets the cached
+    # version, building it if necessary. The methods below avoid that where
+    # they can, and keep the caches up to date.
+    @property  # type: ignore
+    def _items(self) -> List[T]:  # type: ignore
+        if self._list is None:
+            self._list = list(self._keys)
+        return self._list
+
+    @property  # type: ignore
+    def _map(self) -> Dict[T, int]:  # type: ignore
+        if self._index is None:
+            self._index = dict(zip(self._keys, range(len(self._keys))))
+        return self._index
+
+    def _invalidate(self) -> None:
+        """
+        Discard the list of items and the dictionary of indices, after the
+        positions of items have changed.
+        """
+        self._list = None
+        self._index = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._keys)
+
+    def _lookup(self) -> Dict[T, None]:  # type: ignore
+        return self._keys
+
+    __getitem__ = _OrderedSetCore.__getitem__
+    index = _OrderedSetCore.index
+    get_loc = index
+    copy = _OrderedSetBase.copy
+
+    def add(self, key: T) -> int:
+        keys = self._keys
+        if key in keys:
+            return self._map[key]
+        keys[key] = None
+        if self._list is not None:
+            self._list.append(key)
+        if self._index is not None:
+            self._index[key] = len(keys) - 1
+        return len(keys) - 1
+
+    append = add
+
+    def _extend(self, iterable: OrderedSetInitializer[T]) -> None:
+        keys = self._keys
+        if not keys and isinstance(iterable, DictOrderedSet):
+            self._keys = iterable._keys.copy()
+            self._invalidate()
+            return
+        if isinstance(iterable, (AbstractSet, dict)):
+            new_items = iterable
+        else:
+            new_items = dict.fromkeys(iterable)
+        if keys:
+            new_items = list(it.filterfalse(keys.__contains__, new_items))
+        elif not isinstance(new_items, dict):
+            new_items = list(new_items)
+        start = len(keys)
+        keys.update(dict.fromkeys(new_items))
+        if self._list is not None:
+            self._list.extend(new_items)
+        if self._index is not None:
+            self._index.update(zip(new_items, range(start, len(keys))))
+
+    def pop(self, index: int = -1) -> T:
+        if not self._keys:
+            raise KeyError("Set is empty")
+        if index == -1:
+            # Dictionaries can remove their last key without any other
+            # changes, so we can keep the caches.
+            key, _ = self._keys.popitem()
+            if self._list is not None:
+                self._list.pop()
+            if self._index is not None:
+                del self._index[key]
+            return key
+        key = self[index]
+        del self._keys[key]
+        self._invalidate()
+        return key
+
+    def discard(self, key: T) -> None:
+        if key in self._keys:
+            del self._keys[key]
+            self._invalidate()
+
+    def clear(self) -> None:
+        self._keys = {}
+        self._invalidate()
+
+    def _update_items(self, items: list) -> None:
+        self._keys = dict.fromkeys(items)
+        self._list = items
+        self._index = None
+
+    def _restore(self, items: List[T]) -> None:
+        self._extend(items)
+
+
+def _synchronized(method: Any) -> Any:
+    """
+    Wrap a method of ConcurrentOrderedSet so that it holds the set's lock,
+    and so that readers that don't take the lock can tell that it ran.
+    """
+
+    @wraps(method)
+    def synchronized(self, *args, **kwargs):
+        with self._lock:
+            self._version += 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._version += 1
+
+    return synchronized
+
+
+class ConcurrentOrderedSet(OrderedSet[T]):
+    """
+    An OrderedSet that can be shared between threads.
+
+    Methods that modify the set hold a lock, so that the list of items and
+    the dictionary of indices are always changed together. In particular,
+    `.add()` atomically adds an item and returns its index, even when several
+    threads add the same item at once.
+
+    Reads don't take the lock. Checking whether an item is present, and
+    getting the length, are single dictionary operations. Looking up an item
+    or an index reads a version number that every change increments twice,
+    and tries again while holding the lock if a change started or finished
+    in the meantime. Iterating takes a snapshot of the items while holding
+    the lock.
+
+    Example:
+        >>> from concurrent.futures import ThreadPoolExecutor
+        >>> oset = ConcurrentOrderedSet()
+        >>> with ThreadPoolExecutor(4) as pool:
+        ...     indices = list(pool.map(oset.add, ["a", "b", "a", "c"]))
+        >>> sorted(oset) == ["a", "b", "c"] and len(set(indices)) == 3
+        True
+    """
+
+    __slots__ = ("_lock", "_version")
+
+    def __init__(self, initial: OrderedSetInitializer[T] = None):
+        self._lock = threading.RLock()
+        # Odd while a change is in progress.
+        self._version = 0
+        super().__init__(initial)
+
+    def _read(self, method: Any, arg: Any) -> Any:
+        """
+        Call `method(self, arg)` without the lock, and check that nothing
+        changed the set while it ran. If something did, call it again with
+        the lock.
+        """
+        version = self._version
+        if not version & 1:
+            try:
+                result = method(self, arg)
+            except Exception:
+                if self._version == version:
+                    raise
+            else:
+                if self._version == version:
+                    return result
+        with self._lock:
+            return method(self, arg)
+
+    def __getitem__(self, index):
+        return self._read(OrderedSet.__getitem__, index)
+
+    def index(self, key):
+        return self._read(OrderedSet.index, key)
+
+    get_loc = index
+
+    def __iter__(self) -> Iterator[T]:
+        with self._lock:
+            return iter(list(super().__iter__()))
+
+    def __reversed__(self) -> Iterator[T]:
+        with self._lock:
+            return iter(list(super().__reversed__()))
+
+    def index_many(self, keys: Iterable[T], missing: int = -1, add_missing: bool = False):
+        with self._lock:
+            return super().index_many(keys, missing, add_missing)
+
+    add = append = _synchronized(OrderedSet.add)
+    update = _synchronized(OrderedSet.update)
+    copy = _synchronized(OrderedSet.copy)
+    pop = _synchronized(OrderedSet.pop)
+    discard = _synchronized(OrderedSet.discard)
+    clear = _synchronized(OrderedSet.clear)
+    difference_update = _synchronized(OrderedSet.difference_update)
+    intersection_update = _synchronized(OrderedSet.intersection_update)
+    symmetric_difference_update = _synchronized(OrderedSet.symmetric_difference_update)
+    _extend = _synchronized(OrderedSet._extend)
+    _compact = _synchronized(OrderedSet._compact)
+    _update_items = _synchronized(OrderedSet._update_items)
+
+    def __getstate__(self):
+        with self._lock:
+            return super().__getstate__()
+
+
+class MappedOrderedSet(AbstractSet[str], Sequence[str]):
+    """
+    A read-only OrderedSet of strings, stored in a file that's opened with
+    `mmap`, for vocabularies too large to load into memory in every process.
+
+    The file holds the strings encoded as UTF-8, the offset where each one
+    starts, and a hash table of their indices. Looking up an item or its
+    index reads only the parts of the file it needs, and processes that open
+    the same file, or are forked from one that has it open, share the pages
+    that have been read.
+
+    Write the file from an OrderedSet, or any iterable of strings, with
+    `MappedOrderedSet.write(path, items)`.
+
+    Example:
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), "vocab.oset")
+        >>> vocab = MappedOrderedSet.write(path, OrderedSet(["a", "b", "c"]))
+        >>> vocab.index("c")
+        2
+        >>> vocab[1]
+        'b'
+        >>> "d" in vocab
+        False
+        >>> vocab.close()
+    """
+
+    __slots__ = ("path", "_mmap", "_offsets", "_table", "_data", "__weakref__")
+
+    def __init__(self, path: Union[str, "os.PathLike[str]"]):
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._check_header()
+        except ValueError:
+            self._mmap.close()
+            raise
+        _, _, _, count, table_size = _MAPPED_HEADER.unpack_from(self._mmap)
+        start = _MAPPED_HEADER.size
+        table_start = start + 8 * (count + 1)
+        data_start = table_start + 4 * table_size
+        view = memoryview(self._mmap)
+        self._offsets = view[start:table_start].cast("Q")
+        self._table = view[table_start:data_start].cast(_UINT32)
+        self._data = view[data_start:]
+
+    def _check_header(self) -> None:
+        """
+        Raise a ValueError if the file isn't a MappedOrderedSet that we can
+        read.
+        """
+        try:
+            magic, version, big_endian, count, table_size = _MAPPED_HEADER.unpack_from(
+                self._mmap
+            )
+        except struct.error:
+            magic = None
+        if magic != _MAPPED_MAGIC:
+            raise ValueError(f"{self.path} is not a MappedOrderedSet file")
+        if version != _MAPPED_VERSION:
+            raise ValueError(f"Unknown MappedOrderedSet format version {version}")
+        if big_endian != (sys.byteorder == "big"):
+            raise ValueError(f"{self.path} was written with the other byte order")
+        size = _MAPPED_HEADER.size + 8 * (count + 1) + 4 * table_size
+        if len(self._mmap) < size:
+            raise ValueError(f"{self.path} is truncated")
+
+    @classmethod
+    def write(
+        cls, path: Union[str, "os.PathLike[str]"], items: Iterable[str]
+    ) -> "MappedOrderedSet":
+        """
+        Write a file containing the given strings, in order, and open it as a
+        MappedOrderedSet.
+
+        Duplicate strings are only written once. Raises ValueError if any of
+        the items aren't strings.
+        """
+        if not isinstance(items, (_OrderedSetBase, AbstractSet, dict)):
+            items = dict.fromkeys(items)
+        encoded = []
+        for item in items:
+            if not isinstance(item, str):
+                raise ValueError(
+                    f"MappedOrderedSet can only contain strings, not {type(item).__name__}"
+                )
+            encoded.append(item.encode("utf-8", "surrogatepass"))
+        count = len(encoded)
+        if count >= _MAPPED_EMPTY:
+            raise ValueError("MappedOrderedSet can't contain this many strings")
+
+        offsets = array("Q", [0])
+        offsets.extend(it.accumulate(map(len, encoded)))
+        # Keep the hash table at most half full, so probes stay short.
+        table_size = 8
+        while table_size < count * 2:
+            table_size *= 2
+        table = array(_UINT32, [_MAPPED_EMPTY]) * table_size
+        mask = table_size - 1
+        for idx, value in enumerate(encoded):
+            slot = zlib.crc32(value) & mask
+            while table[slot] != _MAPPED_EMPTY:
+                slot = (slot + 1) & mask
+            table[slot] = idx
+
+        header = _MAPPED_HEADER.pack(
+            _MAPPED_MAGIC, _MAPPED_VERSION, sys.byteorder == "big", count, table_size
         )
+        with open(path, "wb") as file:
+            file.write(header)
+            file.write(offsets.tobytes())
+            file.write(table.tobytes())
+            file.writelines(encoded)
+        return cls(path)
+
+    def close(self) -> None:
+        """
+        Close the file. The set can't be used after this.
+        """
+        self._offsets.release()
+        self._table.release()
+        self._data.release()
+        self._mmap.close()
+
+    def __enter__(self) -> "MappedOrderedSet":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __reduce__(self):
+        # Another process can open the same file.
+        return (self.__class__, (self.path,))
+
+    @classmethod
+    def _from_iterable(cls, iterable: Iterable[str]) -> "OrderedSet[str]":
+        # The results of set operations are ordinary OrderedSets.
+        return OrderedSet(iterable)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _item(self, idx: int) -> str:
+        return str(self._data[self._offsets[idx]:self._offsets[idx + 1]], "utf-8", "surrogatepass")
+
+    def _find(self, key: object) -> int:
+        """
+        Get the index of `key`, or -1 if it's not present.
+        """
+        if not isinstance(key, str):
+            return -1
+        value = key.encode("utf-8", "surrogatepass")
+        table = self._table
+        offsets = self._offsets
+        mask = len(table) - 1
+        slot = zlib.crc32(value) & mask
+        while True:
+            idx = table[slot]
+            if idx == _MAPPED_EMPTY:
+                return -1
+            if self._data[offsets[idx]:offsets[idx + 1]] == value:
+                return idx
+            slot = (slot + 1) & mask
+
+    @overload
+    def __getitem__(self, index: slice) -> "OrderedSet[str]":
+        ...
+
+    @overload
+    def __getitem__(self, index: Sequence[int]) -> List[str]:
+        ...
+
+    @overload
+    def __getitem__(self, index: int) -> str:
+        ...
+
+    def __getitem__(self, index):
+        """
+        Get the item at a given index. As with OrderedSet, a slice gives a
+        new OrderedSet, and a list of indices gives a list of items.
+        """
+        if isinstance(index, slice):
+            return OrderedSet(map(self._item, range(*index.indices(len(self)))))
+        elif isinstance(index, Iterable):
+            return [self[i] for i in index]
+        elif hasattr(index, "__index__"):
+            idx = as_index(index)
+            size = len(self)
+            if idx < 0:
+                idx += size
+            if not 0 <= idx < size:
+                raise IndexError("MappedOrderedSet index out of range")
+            return self._item(idx)
+        else:
+            raise TypeError("Don't know how to index a MappedOrderedSet by %r" % index)
+
+    def __contains__(self, key: object) -> bool:
+        return self._find(key) != -1
+
+    @overload
+    def index(self, key: Sequence[str]) -> List[int]:  # type: ignore
+        ...
+
+    @overload
+    def index(self, key: str) -> int:
+        ...
+
+    def index(self, key):
+        """
+        Get the index of a given string, raising a KeyError if it's not
+        present. `key` can also be an iterable of strings, in which case this
+        returns a list of indices.
+        """
+        if isinstance(key, Iterable) and not _is_atomic(key):
+            return [self.index(subkey) for subkey in key]
+        idx = self._find(key)
+        if idx == -1:
+            raise KeyError(key)
+        return idx
+
+    get_loc = index
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._item, range(len(self)))
+
+    def __reversed__(self) -> Iterator[str]:
+        return map(self._item, reversed(range(len(self))))
+
+    def __and__(self, other: Iterable[object]) -> "OrderedSet[str]":  # type: ignore
+        # Look up the items of the other set, instead of iterating over all of
+        # this one, and put them in this set's order.
+        found = set(map(self._find, other))
+        found.discard(-1)
+        return OrderedSet(map(self._item, sorted(found)))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    __eq__ = _OrderedSetBase.__eq__
@@ -0,0 +1,440 @@
+/*
+ * A compiled version of ordered_set._OrderedSetCore: the methods of
+ * OrderedSet that are called most often, which look things up in its
+ * storage.
+ *
+ * The storage is the same as in the pure-Python version: a list of items
+ * (`_items`), a dict from each item to its position in that list (`_map`),
+ * and a sorted list of the positions that hold placeholders for removed
+ * items (`_holes`). The rest of OrderedSet is written in Python and
+ * manipulates these attributes directly.
+ *
+ * When an OrderedSet shares its storage with a copy of it, `_holes` is an
+ * empty tuple instead of a list. The storage can be read as usual, but
+ * adding an item is left to Python, which copies the storage first.
+ *
+ * Only the common cases are handled here. Everything else, such as slices
+ * and fancy indexing, is passed to the pure-Python methods, which
+ * ordered_set registers by calling register_fallbacks().
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include "structmember.h"
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *items;
+    PyObject *map;
+    PyObject *holes;
+} CoreObject;
+
+static PyObject *fallback_len = NULL;
+static PyObject *fallback_contains = NULL;
+static PyObject *fallback_add = NULL;
+static PyObject *fallback_index = NULL;
+static PyObject *fallback_getitem = NULL;
+
+/* Storage that has been replaced with other types is left to Python. */
+static int
+storage_ok(CoreObject *self)
+{
+    return (self->items != NULL && PyList_CheckExact(self->items) &&
+            self->map != NULL && PyDict_CheckExact(self->map) &&
+            self->holes != NULL &&
+            (PyList_CheckExact(self->holes) ||
+             (PyTuple_Check(self->holes) && PyTuple_GET_SIZE(self->holes) == 0)));
+}
+
+/* The number of placeholders, where shared storage has none. */
+static Py_ssize_t
+num_holes(PyObject *holes)
+{
+    return PyList_CheckExact(holes) ? PyList_GET_SIZE(holes) : 0;
+}
+
+static PyObject *
+call_fallback(PyObject *func, CoreObject *self, PyObject *arg)
+{
+    if (func == NULL) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "ordered_set._speedups.register_fallbacks() was not called");
+        return NULL;
+    }
+    return PyObject_CallFunctionObjArgs(func, (PyObject *)self, arg, NULL);
+}
+
+static int
+set_key_error(PyObject *key)
+{
+    /* Wrap the key in a tuple, so a tuple key isn't unpacked as args. */
+    PyObject *args = PyTuple_Pack(1, key);
+    if (args != NULL) {
+        PyErr_SetObject(PyExc_KeyError, args);
+        Py_DECREF(args);
+    }
+    return -1;
+}
+
+/* The number of placeholders stored before position `pos`. */
+static Py_ssize_t
+holes_before(PyObject *holes, Py_ssize_t pos)
+{
+    Py_ssize_t lo = 0, hi = PyList_GET_SIZE(holes);
+    while (lo < hi) {
+        Py_ssize_t mid = lo + (hi - lo) / 2;
+        Py_ssize_t hole = PyLong_AsSsize_t(PyList_GET_ITEM(holes, mid));
+        if (hole == -1 && PyErr_Occurred()) {
+            return -1;
+        }
+        if (hole < pos) {
+            lo = mid + 1;
+        }
+        else {
+            hi = mid;
+        }
+    }
+    return lo;
+}
+
+/* Convert a position in `_items` (from `_map`) into an index. */
+static PyObject *
+pos_to_index(PyObject *holes, PyObject *pos)
+{
+    Py_ssize_t p, before;
+    if (num_holes(holes) == 0) {
+        Py_INCREF(pos);
+        return pos;
+    }
+    p = PyLong_AsSsize_t(pos);
+    if (p == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    before = holes_before(holes, p);
+    if (before < 0) {
+        return NULL;
+    }
+    return PyLong_FromSsize_t(p - before);
+}
+
+/*
+ * Convert a non-negative index into a position in `_items`. See
+ * OrderedSet._position for how this works.
+ */
+static Py_ssize_t
+index_to_pos(PyObject *holes, Py_ssize_t index)
+{
+    Py_ssize_t nholes = num_holes(holes);
+    Py_ssize_t last, lo = 0, hi = nholes;
+    if (nholes == 0) {
+        return index;
+    }
+    last = PyLong_AsSsize_t(PyList_GET_ITEM(holes, nholes - 1));
+    if (last == -1 && PyErr_Occurred()) {
+        return -1;
+    }
+    if (last == nholes - 1) {
+        return index + nholes;
+    }
+    while (lo < hi) {
+        Py_ssize_t mid = lo + (hi - lo) / 2;
+        Py_ssize_t hole = PyLong_AsSsize_t(PyList_GET_ITEM(holes, mid));
+        if (hole == -1 && PyErr_Occurred()) {
+            return -1;
+        }
+        if (hole - mid <= index) {
+            lo = mid + 1;
+        }
+        else {
+            hi = mid;
+        }
+    }
+    return index + lo;
+}
+
+static Py_ssize_t
+core_len(CoreObject *self)
+{
+    PyObject *result;
+    Py_ssize_t size;
+    if (self->map != NULL && PyDict_CheckExact(self->map)) {
+        return PyDict_Size(self->map);
+    }
+    result = call_fallback(fallback_len, self, NULL);
+    if (result == NULL) {
+        return -1;
+    }
+    size = PyLong_AsSsize_t(result);
+    Py_DECREF(result);
+    return size;
+}
+
+static int
+core_contains(CoreObject *self, PyObject *key)
+{
+    PyObject *result;
+    int found;
+    if (self->map != NULL && PyDict_CheckExact(self->map)) {
+        return PyDict_Contains(self->map, key);
+    }
+    result = call_fallback(fallback_contains, self, key);
+    if (result == NULL) {
+        return -1;
+    }
+    found = PyObject_IsTrue(result);
+    Py_DECREF(result);
+    return found;
+}
+
+static PyObject *
+core_add(CoreObject *self, PyObject *key)
+{
+    PyObject *items, *map, *holes, *pos, *result = NULL;
+    if (!storage_ok(self)) {
+        return call_fallback(fallback_add, self, key);
+    }
+    /* Hold on to the storage, in case hashing the key replaces it. */
+    items = self->items;
+    map = self->map;
+    holes = self->holes;
+    Py_INCREF(items);
+    Py_INCREF(map);
+    Py_INCREF(holes);
+
+    pos = PyDict_GetItemWithError(map, key);
+    if (pos != NULL) {
+        result = pos_to_index(holes, pos);
+    }
+    else if (!PyErr_Occurred() && !PyList_CheckExact(holes)) {
+        /* The storage is shared, so Python has to copy it first. */
+        result = call_fallback(fallback_add, self, key);
+    }
+    else if (!PyErr_Occurred()) {
+        PyObject *new_pos = PyLong_FromSsize_t(PyList_GET_SIZE(items));
+        if (new_pos != NULL) {
+            if (PyDict_SetItem(map, key, new_pos) == 0) {
+                if (PyList_Append(items, key) == 0) {
+                    result = PyLong_FromSsize_t(PyDict_Size(map) - 1);
+                }
+                else {
+                    PyObject *type, *value, *traceback;
+                    PyErr_Fetch(&type, &value, &traceback);
+                    PyDict_DelItem(map, key);
+                    PyErr_Restore(type, value, traceback);
+                }
+            }
+            Py_DECREF(new_pos);
+        }
+    }
+    Py_DECREF(items);
+    Py_DECREF(map);
+    Py_DECREF(holes);
+    return result;
+}
+
+static PyObject *
+core_index(CoreObject *self, PyObject *key)
+{
+    PyObject *map, *holes, *pos, *result = NULL;
+    /*
+     * Iterables other than strings and tuples are looked up item by item,
+     * which is left to Python. These are the types we know aren't.
+     */
+    int atomic = (PyUnicode_CheckExact(key) || PyLong_CheckExact(key) ||
+                  PyTuple_CheckExact(key) || PyFloat_CheckExact(key) ||
+                  PyBool_Check(key) || key == Py_None);
+    if (!atomic || !storage_ok(self)) {
+        return call_fallback(fallback_index, self, key);
+    }
+    map = self->map;
+    holes = self->holes;
+    Py_INCREF(map);
+    Py_INCREF(holes);
+
+    pos = PyDict_GetItemWithError(map, key);
+    if (pos != NULL) {
+        result = pos_to_index(holes, pos);
+    }
+    else if (!PyErr_Occurred()) {
+        set_key_error(key);
+    }
+    Py_DECREF(map);
+    Py_DECREF(holes);
+    return result;
+}
+
+static PyObject *
+core_getitem(CoreObject *self, PyObject *index)
+{
+    Py_ssize_t i, size, pos;
+    PyObject *item;
+    if (!PyLong_CheckExact(index) || !storage_ok(self)) {
+        return call_fallback(fallback_getitem, self, index);
+    }
+    i = PyLong_AsSsize_t(index);
+    if (i == -1 && PyErr_Occurred()) {
+        PyErr_Clear();
+        return call_fallback(fallback_getitem, self, index);
+    }
+    if (num_holes(self->holes) == 0) {
+        size = PyList_GET_SIZE(self->items);
+        if (i < 0) {
+            i += size;
+        }
+        if (i < 0 || i >= size) {
+            PyErr_SetString(PyExc_IndexError, "list index out of range");
+            return NULL;
+        }
+        item = PyList_GET_ITEM(self->items, i);
+        Py_INCREF(item);
+        return item;
+    }
+    size = PyDict_Size(self->map);
+    if (i < 0) {
+        i += size;
+    }
+    if (i < 0 || i >= size) {
+        PyErr_SetString(PyExc_IndexError, "OrderedSet index out of range");
+        return NULL;
+    }
+    pos = index_to_pos(self->holes, i);
+    if (pos < 0) {
+        return NULL;
+    }
+    if (pos >= PyList_GET_SIZE(self->items)) {
+        PyErr_SetString(PyExc_RuntimeError, "OrderedSet storage is inconsistent");
+        return NULL;
+    }
+    item = PyList_GET_ITEM(self->items, pos);
+    Py_INCREF(item);
+    return item;
+}
+
+static int
+core_traverse(CoreObject *self, visitproc visit, void *arg)
+{
+    Py_VISIT(self->items);
+    Py_VISIT(self->map);
+    Py_VISIT(self->holes);
+    return 0;
+}
+
+static int
+core_clear(CoreObject *self)
+{
+    Py_CLEAR(self->items);
+    Py_CLEAR(self->map);
+    Py_CLEAR(self->holes);
+    return 0;
+}
+
+static void
+core_dealloc(CoreObject *self)
+{
+    PyObject_GC_UnTrack(self);
+    core_clear(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyMemberDef core_members[] = {
+    {"_items", T_OBJECT_EX, offsetof(CoreObject, items), 0, NULL},
+    {"_map", T_OBJECT_EX, offsetof(CoreObject, map), 0, NULL},
+    {"_holes", T_OBJECT_EX, offsetof(CoreObject, holes), 0, NULL},
+    {NULL}
+};
+
+static PyMethodDef core_methods[] = {
+    {"add", (PyCFunction)core_add, METH_O,
+     "Add `key` as an item to this OrderedSet, then return its index."},
+    {"index", (PyCFunction)core_index, METH_O,
+     "Get the index of a given entry, raising a KeyError if it's not present."},
+    {NULL}
+};
+
+static PySequenceMethods core_as_sequence = {
+    .sq_length = (lenfunc)core_len,
+    .sq_contains = (objobjproc)core_contains,
+};
+
+static PyMappingMethods core_as_mapping = {
+    .mp_length = (lenfunc)core_len,
+    .mp_subscript = (binaryfunc)core_getitem,
+};
+
+static PyTypeObject CoreType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "ordered_set._speedups.OrderedSetCore",
+    .tp_doc = "Compiled version of ordered_set._OrderedSetCore.",
+    .tp_basicsize = sizeof(CoreObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE | Py_TPFLAGS_HAVE_GC,
+    .tp_dealloc = (destructor)core_dealloc,
+    .tp_traverse = (traverseproc)core_traverse,
+    .tp_clear = (inquiry)core_clear,
+    .tp_as_sequence = &core_as_sequence,
+    .tp_as_mapping = &core_as_mapping,
+    .tp_methods = core_methods,
+    .tp_members = core_members,
+};
+
+static int
+get_fallback(PyObject *cls, const char *name, PyObject **slot)
+{
+    PyObject *func = PyObject_GetAttrString(cls, name);
+    if (func == NULL) {
+        return -1;
+    }
+    Py_XSETREF(*slot, func);
+    return 0;
+}
+
+static PyObject *
+register_fallbacks(PyObject *module, PyObject *cls)
+{
+    if (get_fallback(cls, "__len__", &fallback_len) < 0 ||
+        get_fallback(cls, "__contains__", &fallback_contains) < 0 ||
+        get_fallback(cls, "add", &fallback_add) < 0 ||
+        get_fallback(cls, "index", &fallback_index) < 0 ||
+        get_fallback(cls, "__getitem__", &fallback_getitem) < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef module_methods[] = {
+    {"register_fallbacks", register_fallbacks, METH_O,
+     "Set the pure-Python class whose methods handle the uncommon cases."},
+    {NULL}
+};
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "ordered_set._speedups",
+    .m_doc = "Compiled versions of the most frequently used OrderedSet methods.",
+    .m_size = -1,
+    .m_methods = module_methods,
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    PyObject *module;
+    /*
+     * Use object's constructor, so that object.__new__(OrderedSet) works, as
+     * it does without this base class. Pickles made with protocols 0 and 1
+     * create OrderedSets that way.
+     */
+    CoreType.tp_new = PyBaseObject_Type.tp_new;
+    if (PyType_Ready(&CoreType) < 0) {
+        return NULL;
+    }
+    module = PyModule_Create(&speedups_module);
+    if (module == NULL) {
+        return NULL;
+    }
+    Py_INCREF(&CoreType);
+    if (PyModule_AddObject(module, "OrderedSetCore", (PyObject *)&CoreType) < 0) {
+        Py_DECREF(&CoreType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
@@ -4,10 +4,20 @@
 # The primary setup is in pyproject.toml. You can install ordered-set as a
 # dependency using `poetry` or `pip`.
 
-from setuptools import setup
+import platform
+
+from setuptools import Extension, setup
 
 packages = ['ordered_set']
 
+# The compiled accelerator is optional: if it can't be built, OrderedSet
+# uses its pure-Python implementation.
+ext_modules = []
+if platform.python_implementation() == 'CPython':
+    ext_modules.append(
+        Extension('ordered_set._speedups', ['ordered_set/_speedups.c'], optional=True)
+    )
+
 setup_kwargs = {
     'name': 'ordered-set',
     'version': '4.1.0',
@@ -16,6 +26,7 @@ setup_kwargs = {
     'author_email': 'gh@arborelia.net',
     'url': 'https://github.com/rspeer/ordered-set',
     'packages': packages,
+    'ext_modules': ext_modules,
     'python_requires': '>=3.7',
 }
 
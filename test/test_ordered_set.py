@@ -1,13 +1,22 @@
 import collections
 import itertools as it
 import operator
+import os
 import pickle
+import threading
 import random
 import sys
 
 import pytest
 
-from ordered_set import OrderedSet
+from ordered_set import (
+    CompactOrderedSet,
+    ConcurrentOrderedSet,
+    DictOrderedSet,
+    FrozenOrderedSet,
+    MappedOrderedSet,
+    OrderedSet,
+)
 
 
 def test_pickle():
@@ -22,6 +31,84 @@ def test_empty_pickle():
     assert empty_roundtrip == empty_oset
 
 
+def test_old_protocol_pickle():
+    set1 = OrderedSet("abracadabra")
+    set1.discard("b")
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        roundtrip = pickle.loads(pickle.dumps(set1, protocol))
+        assert roundtrip == set1
+        assert roundtrip.index("d") == 3
+
+
+def test_load_old_pickles():
+    # Pickles made by version 4.1
+    old_pickles = [
+        b"ccopy_reg\n_reconstructor\np0\n(cordered_set\nOrderedSet\np1\nc__builtin__\n"
+        b"object\np2\nNtp3\nRp4\n(lp5\nVa\np6\naI1\na(I2\nI3\ntp7\nab.",
+        b"\x80\x02cordered_set\nOrderedSet\nq\x00)\x81q\x01]q\x02(X\x01\x00\x00\x00aq"
+        b"\x03K\x01K\x02K\x03\x86q\x04eb.",
+        b"\x80\x04\x952\x00\x00\x00\x00\x00\x00\x00\x8c\x0bordered_set\x94\x8c\nOrderedSet"
+        b"\x94\x93\x94)\x81\x94]\x94(\x8c\x01a\x94K\x01K\x02K\x03\x86\x94eb.",
+    ]
+    for data in old_pickles:
+        set1 = pickle.loads(data)
+        assert set1 == ["a", 1, (2, 3)]
+        assert set1.index((2, 3)) == 2
+    empty = pickle.loads(
+        b"\x80\x04\x95%\x00\x00\x00\x00\x00\x00\x00\x8c\x0bordered_set\x94\x8c\n"
+        b"OrderedSet\x94\x93\x94)\x81\x94N\x85\x94b."
+    )
+    assert empty == OrderedSet()
+
+
+def test_unpickle_duplicates():
+    set1 = OrderedSet()
+    set1.__setstate__(["a", "b", "a"])
+    assert set1 == ["a", "b"]
+    assert set1.index("b") == 1
+
+
+def test_bytes_roundtrip():
+    examples = [
+        ["a", "", "\xe9", "\ud800", "b"],
+        ["a\0b", "\0", ""],
+        [b"a", b"", b"\xff"],
+        [b"\0", b"a"],
+        [3, -1, 2 ** 63 - 1, -(2 ** 63)],
+        [""],
+        [],
+    ]
+    for items in examples:
+        for cls in (OrderedSet, FrozenOrderedSet, CompactOrderedSet, DictOrderedSet):
+            set1 = cls(items)
+            set2 = cls.from_bytes(set1.to_bytes())
+            assert type(set2) is cls
+            assert set2 == items
+            assert set2.index_many(items) == list(range(len(items)))
+
+
+def test_bytes_errors():
+    for items in (["a", 1], [2 ** 64], [True], [1.5]):
+        with pytest.raises(ValueError):
+            OrderedSet(items).to_bytes()
+    data = OrderedSet(["a", "b"]).to_bytes()
+    for bad in (b"", b"NOPE" + data[4:], data[:4] + b"\x63" + data[5:], data[:-2]):
+        with pytest.raises(ValueError):
+            OrderedSet.from_bytes(bad)
+    assert OrderedSet.from_bytes(bytearray(data)) == ["a", "b"]
+
+
+def test_backend():
+    # The tests run against whichever implementation of the core methods
+    # was selected when ordered_set was imported.
+    core = OrderedSet.__mro__[2]
+    assert core.__name__ in ("_OrderedSetCore", "OrderedSetCore")
+    if os.environ.get("ORDERED_SET_PURE_PYTHON"):
+        assert core.__module__ == "ordered_set"
+    else:
+        assert core.__module__ in ("ordered_set", "ordered_set._speedups")
+
+
 def test_order():
     set1 = OrderedSet("abracadabra")
     assert len(set1) == 5
@@ -81,12 +168,85 @@ def test_fancy_index_class():
     assert "".join(set1[indexer]) == "badcar"
 
 
+def test_index_key_types():
+    class MyStr(str):
+        pass
+
+    set1 = OrderedSet(["ab", ("t", 1), 2.5, None, True])
+    assert set1.index(MyStr("ab")) == 0
+    assert set1.index(("t", 1)) == 1
+    assert set1.index(2.5) == 2
+    assert set1.index(None) == 3
+    assert set1.index(1) == 4
+    with pytest.raises(KeyError) as excinfo:
+        set1.index(("t", 2))
+    assert excinfo.value.args == (("t", 2),)
+
+
 def test_pandas_compat():
     set1 = OrderedSet("abracadabra")
     assert set1.get_loc("b") == 1
     assert set1.get_indexer(["b", "r"]) == [1, 2]
 
 
+def test_index_many():
+    set1 = OrderedSet(["a", "b", ("c", "d"), "e"])
+    assert set1.index_many(["e", "z", ("c", "d")]) == [3, -1, 2]
+    assert set1.index_many(iter(["z", "a"]), missing=None) == [None, 0]
+
+    set1.discard("a")
+    assert set1.index_many(["e", "z", "b"]) == [2, -1, 0]
+    assert set1.index_many(iter(["z", "e", "y", "z"]), add_missing=True) == [3, 2, 4, 3]
+    assert list(set1) == ["b", ("c", "d"), "e", "z", "y"]
+    assert set1.index_many([]) == []
+
+    with pytest.raises(TypeError):
+        set1.index_many([["b"]])
+
+
+def test_numpy_index_many():
+    np = pytest.importorskip("numpy")
+    set1 = OrderedSet("abcde")
+    set1.discard("b")
+    indices = set1.index_many(np.array(["e", "z", "a"]), missing=99)
+    assert indices.dtype == np.int64
+    assert indices.tolist() == [3, 99, 0]
+
+    indices = set1.index_many(np.array(["x", "e", "x"]), add_missing=True)
+    assert indices.tolist() == [4, 3, 4]
+    assert "".join(set1) == "acdex"
+
+
+def test_numpy_fancy_index():
+    np = pytest.importorskip("numpy")
+    set1 = OrderedSet("abracadabra")
+    assert set1[np.array([1, 0, 4, 3, 0, -1])] == ["b", "a", "d", "c", "a", "d"]
+    assert set1.index(np.array(["d", "a"])) == [4, 0]
+    with pytest.raises(IndexError):
+        set1[np.array([0, 5])]
+    with pytest.raises(KeyError):
+        set1.index(np.array(["a", "z"]))
+
+    set1.discard("b")
+    assert set1[np.array([0, 1, -1, -4])] == ["a", "r", "d", "a"]
+    assert set1.index(np.array(["d", "a"])) == [3, 0]
+    with pytest.raises(IndexError):
+        set1[np.array([-5])]
+
+
+def test_numpy_get_indexer():
+    np = pytest.importorskip("numpy")
+    set1 = OrderedSet("abracadabra")
+    indexer = set1.get_indexer(np.array(["r", "z", "a", "d"]))
+    assert indexer.dtype == np.int64
+    assert indexer.tolist() == [2, -1, 0, 4]
+
+    set1.discard("a")
+    indexer = set1.get_indexer(np.array(["r", "z", "a", "d"], dtype=object))
+    assert indexer.tolist() == [1, -1, -1, 3]
+    assert set1.get_indexer(np.array([], dtype=object)).tolist() == []
+
+
 def test_tuples():
     set1 = OrderedSet()
     tup = ("tuple", 1)
@@ -120,6 +280,46 @@ def test_remove():
     set1.discard("a")
 
 
+def test_remove_many():
+    set1 = OrderedSet(range(100))
+    for i in range(0, 100, 3):
+        set1.remove(i)
+    expected = [i for i in range(100) if i % 3]
+
+    assert len(set1) == len(expected)
+    assert list(set1) == expected
+    assert list(reversed(set1)) == expected[::-1]
+    assert set1.index(expected[-1]) == len(expected) - 1
+    assert set1.add(expected[10]) == 10
+    assert set1.add(100) == len(expected)
+    assert set1[10] == expected[10]
+    assert set1[-2] == expected[-1]
+    assert set1.items == expected + [100]
+    assert set1.map == {item: i for (i, item) in enumerate(expected + [100])}
+
+
+def test_random_churn():
+    rng = random.Random(0)
+    set1 = OrderedSet()
+    expected = []
+    for _ in range(2000):
+        item = rng.randrange(50)
+        if rng.random() < 0.5:
+            set1.discard(item)
+            if item in expected:
+                expected.remove(item)
+        else:
+            set1.add(item)
+            if item not in expected:
+                expected.append(item)
+        assert len(set1) == len(expected)
+        if expected:
+            i = rng.randrange(len(expected))
+            assert set1.index(expected[i]) == i
+    assert list(set1) == expected
+    assert [set1[i] for i in range(len(set1))] == expected
+
+
 def test_remove_error():
     # If we .remove() an element that's not there, we get a KeyError
     set1 = OrderedSet("abracadabra")
@@ -150,6 +350,39 @@ def test_update():
     assert "".join(set2) == "abcdef"
 
 
+def test_update_bulk_types():
+    set1 = OrderedSet([3, 1])
+    assert set1.update({1: "a", 4: "b"}) == 2
+    assert set1.update(OrderedSet([5, 3, 9])) == 4
+    assert set1.update(iter([2, 6, 2])) == 5
+    assert set1.update(frozenset([6])) == 6
+    assert set1.update([]) == 0
+    assert list(set1) == [3, 1, 4, 5, 9, 2, 6]
+    assert set1.map == {item: i for (i, item) in enumerate(set1)}
+
+    with pytest.raises(ValueError):
+        set1.update([[1, 2]])
+
+
+def test_init_from_oset():
+    set1 = OrderedSet("abracadabra")
+    set1.discard("b")
+    set2 = OrderedSet(set1)
+    set2.add("z")
+    assert list(set1) == ["a", "r", "c", "d"]
+    assert list(set2) == ["a", "r", "c", "d", "z"]
+    assert set2.index("z") == 4
+
+    with pytest.raises(TypeError):
+        OrderedSet(3)
+
+
+def test_union_types():
+    set1 = OrderedSet([1, 2]).union({3}, (4, 1), iter([5, 2]), {6: None})
+    assert list(set1) == [1, 2, 3, 4, 5, 6]
+    assert set1.index(6) == 5
+
+
 def test_pop():
     set1 = OrderedSet("ab")
     elem = set1.pop()
@@ -162,6 +395,412 @@ def test_pop():
     pytest.raises(KeyError, set1.pop)
 
 
+def test_pop_index():
+    set1 = OrderedSet("abcdefg")
+    assert set1.pop(0) == "a"
+    assert set1.pop(2) == "d"
+    assert set1.pop(-2) == "f"
+
+    assert list(set1) == ["b", "c", "e", "g"]
+    assert set1.index(["b", "c", "e", "g"]) == [0, 1, 2, 3]
+    assert set1[[3, 1]] == ["g", "c"]
+    assert set1.add("a") == 4
+
+    with pytest.raises(IndexError):
+        set1.pop(5)
+    with pytest.raises(IndexError):
+        set1.pop(-6)
+    with pytest.raises(IndexError):
+        set1[5]
+
+
+def test_popleft():
+    set1 = OrderedSet(range(10))
+    assert [set1.popleft() for _ in range(3)] == [0, 1, 2]
+    assert set1.index(3) == 0
+    assert set1[0] == 3
+    assert set1[-1] == 9
+
+    set1.update(range(20))
+    assert list(set1) == list(range(3, 10)) + [0, 1, 2] + list(range(10, 20))
+    expected = list(set1)
+    assert [set1.popleft() for _ in range(len(expected))] == expected
+    assert len(set1) == 0
+    with pytest.raises(KeyError):
+        set1.popleft()
+
+
+def test_random_pop():
+    rng = random.Random(1)
+    set1 = OrderedSet(range(500))
+    expected = list(range(500))
+    while expected:
+        i = rng.randrange(-len(expected), len(expected))
+        assert set1.pop(i) == expected.pop(i)
+        if expected:
+            j = rng.randrange(len(expected))
+            assert set1[j] == expected[j]
+            assert set1.index(expected[j]) == j
+    assert list(set1) == []
+
+
+def test_compact_small():
+    set1 = CompactOrderedSet("abracadabra")
+    assert set1 == OrderedSet("abracadabra")
+    assert set1._table is None
+    assert set1.add("b") == 1
+    assert set1.index(["d", "a"]) == [4, 0]
+    assert set1.map == {"a": 0, "b": 1, "r": 2, "c": 3, "d": 4}
+    assert set1[1:3] == CompactOrderedSet("br")
+    assert set1.pop(0) == "a"
+    set1.discard("c")
+    assert list(set1) == ["b", "r", "d"]
+    assert set1.index("d") == 2
+    assert "c" not in set1
+    assert set1._table is None
+    assert not hasattr(set1, "__dict__")
+    with pytest.raises(KeyError):
+        set1.index("z")
+    with pytest.raises(TypeError):
+        set1.add(["unhashable"])
+
+
+def test_compact_grows():
+    set1 = CompactOrderedSet()
+    for i in range(20):
+        assert set1.add(i) == i
+    assert set1._table is not None
+    set1.remove(3)
+    assert set1.index(4) == 3
+    assert set1[3] == 4
+    assert set1 == list(range(3)) + list(range(4, 20))
+
+    set1.clear()
+    assert set1._table is None
+    set1.update(range(30))
+    assert set1._table is not None
+    assert set1.index(29) == 29
+
+
+def test_compact_operations():
+    set1 = CompactOrderedSet([5, 3, 1, 4])
+    set2 = CompactOrderedSet([1, 4])
+    assert type(set1 | set2) is CompactOrderedSet
+    assert set1 - set2 == [5, 3]
+    assert set1 & set2 == [1, 4]
+    set1.symmetric_difference_update([4, 6])
+    assert set1 == [5, 3, 1, 6]
+    assert set1._table is None
+    assert pickle.loads(pickle.dumps(set1)) == set1
+
+
+def test_dict_storage():
+    set1 = DictOrderedSet("abracadabra")
+    assert set1 == OrderedSet("abracadabra")
+    assert set1._list is None and set1._index is None
+    assert "r" in set1
+    assert list(set1) == ["a", "b", "r", "c", "d"]
+    assert set1._list is None and set1._index is None
+
+    assert set1.add("x") == 5
+    assert set1.index("r") == 2
+    assert set1.add("y") == 6
+    assert set1._map["y"] == 6
+    assert set1.pop() == "y"
+    assert set1._index is not None
+
+    set1.remove("b")
+    assert set1._index is None
+    assert set1[1] == "r"
+    assert set1.index(["x", "a"]) == [4, 0]
+    assert set1.pop(0) == "a"
+    assert list(reversed(set1)) == ["x", "d", "c", "r"]
+    assert set1.index_many(["c", "z"]) == [1, -1]
+    assert not hasattr(set1, "__dict__")
+
+
+def test_dict_storage_operations():
+    set1 = DictOrderedSet([5, 3, 1, 4])
+    set1.index(5)
+    set1.update([2, 3, 6])
+    assert set1.index(6) == 5
+    assert set1[-1] == 6
+    set1.difference_update([3])
+    assert set1 == [5, 1, 4, 2, 6]
+    assert set1.index(6) == 4
+
+    set2 = set1.copy()
+    set2.add(7)
+    assert type(set2) is DictOrderedSet
+    assert 7 not in set1
+    assert set1 | [0] == [5, 1, 4, 2, 6, 0]
+    assert pickle.loads(pickle.dumps(set1)) == set1
+    set1.clear()
+    assert len(set1) == 0
+    with pytest.raises(KeyError):
+        set1.pop()
+
+
+def test_copy_on_write():
+    base = OrderedSet(range(10))
+    base.discard(3)
+    copies = [base.copy(), base[:], base.copy().copy()]
+    assert all(copy._items is base._items for copy in copies)
+    copies[0].add(10)
+    copies[1].discard(4)
+    copies[2].pop(0)
+    assert base == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+    assert base.index(9) == 8 and base[8] == 9
+    assert copies[0] == [0, 1, 2, 4, 5, 6, 7, 8, 9, 10]
+    assert copies[1] == [0, 1, 2, 5, 6, 7, 8, 9]
+    assert copies[2] == [1, 2, 4, 5, 6, 7, 8, 9]
+
+    # Modifying the original doesn't change the copies either.
+    other = base.copy()
+    for modify in (
+        lambda oset: oset.append(11),
+        lambda oset: oset.update([12]),
+        lambda oset: oset.popleft(),
+        lambda oset: oset.remove(5),
+        lambda oset: oset.clear(),
+        lambda oset: oset.index_many([13], add_missing=True),
+        lambda oset: oset.intersection_update([1, 2]),
+    ):
+        copy = base.copy()
+        modify(base)
+        assert copy == other
+        base = copy
+    assert base.add(1) == 1
+    assert base == other
+
+
+def test_frozen():
+    set1 = FrozenOrderedSet([5, 1, 4, 2, 6])
+    assert hash(set1) == hash(frozenset(set1))
+    assert {set1: "x"}[FrozenOrderedSet([5, 1, 4, 2, 6])] == "x"
+    assert set1 == {1, 2, 4, 5, 6}
+    assert set1.copy() is set1
+    assert set1[:] is set1
+    set2 = FrozenOrderedSet(set1)
+    assert set2._items is set1._items
+    with pytest.raises(TypeError):
+        set1.add(3)
+    with pytest.raises(TypeError):
+        set1.index_many([3], add_missing=True)
+    assert not hasattr(set1, "discard")
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        unpickled = pickle.loads(pickle.dumps(set1, protocol))
+        assert unpickled == set1 and hash(unpickled) == hash(set1)
+
+
+def test_frozen_operations():
+    set1 = FrozenOrderedSet([5, 1, 4, 2, 6])
+    assert set1[:3] == [5, 1, 4]
+    assert set1[:3].map == {5: 0, 1: 1, 4: 2}
+    assert set1[1:4] == [1, 4, 2]
+    assert set1[::-1] == [6, 2, 4, 1, 5]
+    assert set1.union({1, 2}) is set1
+    assert set1 | [7] == [5, 1, 4, 2, 6, 7]
+    assert set1.intersection(range(7)) is set1
+    assert set1.intersection([1, 5]).map == {5: 0, 1: 1}
+    assert (set1 & {6, 1}).map == {1: 0, 6: 1}
+    assert set1.difference([]) is set1
+    assert (set1 - [2, 6]).map == {5: 0, 1: 1, 4: 2}
+    assert set1 - {5} == [1, 4, 2, 6]
+    assert set1.symmetric_difference([6, 7]) == [5, 1, 4, 2, 7]
+    for result in (set1[:2], set1 | [7], set1 & {1}, set1 - {5}):
+        assert type(result) is FrozenOrderedSet
+    assert OrderedSet(set1).add(7) == 5
+    assert set1 == [5, 1, 4, 2, 6]
+
+
+def test_mapped(tmp_path):
+    items = ["w%d" % i for i in range(1000)] + ["\xe9", "\ud800", ""]
+    path = tmp_path / "vocab.oset"
+    with MappedOrderedSet.write(path, OrderedSet(items)) as vocab:
+        assert len(vocab) == len(items)
+        assert list(vocab) == items
+        assert list(reversed(vocab)) == items[::-1]
+        assert [vocab.index(item) for item in items] == list(range(len(items)))
+        assert vocab.index(["w5", ""]) == [5, len(items) - 1]
+        assert vocab[3] == "w3" and vocab[-1] == ""
+        assert vocab[1:3] == OrderedSet(["w1", "w2"])
+        assert vocab[[2, 0]] == ["w2", "w0"]
+        assert "w999" in vocab and "w1000" not in vocab and 5 not in vocab
+        with pytest.raises(KeyError):
+            vocab.index("missing")
+        with pytest.raises(IndexError):
+            vocab[len(items)]
+        assert vocab == items and vocab == set(items)
+        assert vocab & ["w3", "x", "w1"] == ["w1", "w3"]
+        assert repr(vocab) == "MappedOrderedSet(%r)" % str(path)
+        unpickled = pickle.loads(pickle.dumps(vocab))
+        assert unpickled.index("w10") == 10
+        unpickled.close()
+
+
+def test_mapped_write(tmp_path):
+    path = tmp_path / "vocab.oset"
+    with MappedOrderedSet.write(path, iter(["b", "a", "b"])) as vocab:
+        assert vocab == ["b", "a"]
+    with MappedOrderedSet.write(path, []) as vocab:
+        assert len(vocab) == 0 and list(vocab) == [] and "a" not in vocab
+    with pytest.raises(ValueError):
+        MappedOrderedSet.write(path, ["a", 1])
+    MappedOrderedSet.write(path, ["a", "b"]).close()
+    data = path.read_bytes()
+    for bad in (b"not an OrderedSet" * 2, b"OSMM", data[:40]):
+        path.write_bytes(bad)
+        with pytest.raises(ValueError):
+            MappedOrderedSet(path)
+
+
+def test_iter_operations():
+    set1 = OrderedSet([5, 1, 4, 2, 6])
+    others = ([1, 7, 1], {6, 8}, OrderedSet([2, 9]))
+    union = set1.iter_union(*others)
+    assert not isinstance(union, OrderedSet)
+    assert list(union) == list(set1.union(*others))
+    assert list(set1.iter_union(iter([0, 5, 0]))) == [5, 1, 4, 2, 6, 0]
+    assert list(set1.iter_intersection(*others)) == []
+    assert list(set1.iter_intersection({1, 2, 6}, iter([6, 1]))) == [1, 6]
+    assert list(set1.iter_intersection()) == list(set1)
+    assert list(set1.iter_difference(*others)) == list(set1.difference(*others))
+    assert list(set1.iter_difference(iter([4]), {"a": 1, 5: 2})) == [1, 2, 6]
+
+
+def test_eq_without_copies():
+    nan = float("nan")
+    set1 = OrderedSet([1, nan, "a"])
+    assert set1 == [1, nan, "a"]
+    assert set1 == (1, nan, "a")
+    assert set1 == OrderedSet([1, nan, "a"])
+    assert set1 != [1, nan]
+    assert set1 != [1, "a", nan]
+    assert set1 == {"a", 1, nan}
+    assert set1 == {"a": 0, 1: 1, nan: 2}.keys()
+    assert set1 != {"a", 1, nan, 2}
+    assert set1 != {"a", 1}
+    assert OrderedSet([1, 2]) == DictOrderedSet([1, 2])
+    assert OrderedSet([1, 2]) != DictOrderedSet([2, 1])
+
+
+def test_operations_with_set_operands():
+    big = OrderedSet(range(100))
+    big.discard(50)
+    small = OrderedSet([99, 3, 50, 7])
+    assert big.intersection(small) == [3, 7, 99]
+    assert big.intersection({7: "x", 3: "y"}, iter([7])) == [7]
+    assert big.intersection(small, {1, 2}) == []
+    assert OrderedSet.intersection([3, 1, 3], {3}) == [3]
+    assert big & range(98, 200) == [98, 99]
+
+    # Items that are equal but not identical come from the first set.
+    result = OrderedSet([1, 2.0] + list(range(3, 40))) & {True, 2}
+    assert [type(item) for item in result] == [int, float]
+
+    set1 = OrderedSet(range(20))
+    set1.intersection_update({19, 4, 100})
+    assert set1 == [4, 19] and set1.index(19) == 1
+    set1.difference_update(OrderedSet([4]), iter([5]))
+    assert set1 == [19]
+    set1.symmetric_difference_update(iter([1, 19, 2, 1]))
+    assert set1 == [1, 2] and set1.index(2) == 1
+    set1.symmetric_difference_update(set1)
+    assert set1 == []
+
+
+def test_update_in_place():
+    for cls in (OrderedSet, CompactOrderedSet, DictOrderedSet):
+        set1 = cls(range(20))
+        set1.difference_update(iter([3, 3, 50]), {0: None}, set(range(15, 100)))
+        assert set1 == [1, 2] + list(range(4, 15))
+        assert set1.index(14) == 12 and set1[2] == 4
+        set1.intersection_update(range(2, 13))
+        assert set1 == [2] + list(range(4, 13))
+        assert set1.index(12) == 9
+        set1.intersection_update({4, 12})
+        assert set1 == [4, 12] and set1.index(12) == 1
+        set1.symmetric_difference_update(iter([7, 12, 7, 8]))
+        assert set1 == [4, 7, 8] and set1.index(8) == 2
+        set1.difference_update(set1)
+        assert set1 == []
+        set1.update([1, 2])
+        set1.symmetric_difference_update(set1)
+        assert set1 == []
+
+    # Removing a few items doesn't rebuild the storage.
+    set1 = OrderedSet(range(1000))
+    items = set1._items
+    set1.difference_update([5, 500])
+    set1.intersection_update(range(1, 1000))
+    set1.symmetric_difference_update([7, 1000])
+    assert set1._items is items
+    assert set1.index(1000) == 996
+
+
+def test_concurrent_stress():
+    oset = ConcurrentOrderedSet()
+    num_threads = 8
+    per_thread = 2000
+    results = [None] * num_threads
+    errors = []
+    barrier = threading.Barrier(num_threads + 1)
+
+    def writer(thread_num):
+        barrier.wait()
+        # The threads add overlapping ranges, and remove some items again.
+        indices = {}
+        for n in range(thread_num * 500, thread_num * 500 + per_thread):
+            indices[n] = oset.add(n)
+            if n % 7 == 0:
+                oset.discard(n - 3)
+        results[thread_num] = indices
+
+    def reader():
+        barrier.wait()
+        while any(result is None for result in results):
+            try:
+                for item in list(oset)[:50]:
+                    assert oset[oset.index(item)] == item or item not in oset
+            except KeyError:
+                # The item was removed after the snapshot.
+                pass
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=writer, args=(num,)) for num in range(num_threads)]
+    threads.append(threading.Thread(target=reader))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(oset) == len(oset.items) == len(oset.map)
+    assert all(oset.index(item) == i for i, item in enumerate(oset))
+    assert all(oset[i] == item for i, item in enumerate(oset))
+    removed = {n - 3 for n in range(num_threads * 500 + per_thread) if n % 7 == 0}
+    assert set(oset) == set(range(num_threads * 500 + per_thread)) - removed - {
+        n for n in removed if n < 0
+    }
+
+
+def test_concurrent_operations():
+    oset = ConcurrentOrderedSet("abracadabra")
+    assert oset.add("z") == 5
+    assert oset.update("xy") == 7
+    assert oset.copy() == oset and type(oset.copy()) is ConcurrentOrderedSet
+    assert oset.pop(0) == "a" and oset.popleft() == "b"
+    oset.difference_update("r")
+    assert oset == ["c", "d", "z", "x", "y"]
+    assert oset[1:3] == ["d", "z"] and oset.index("y") == 4
+    assert list(reversed(oset))[0] == "y"
+    unpickled = pickle.loads(pickle.dumps(oset))
+    assert unpickled == oset and unpickled.add("q") == 5
+
+
 def test_getitem_type_error():
     set1 = OrderedSet("ab")
     with pytest.raises(TypeError):